@@ -73,6 +73,12 @@ This is free software, and you are welcome to redistribute it under certain cond
     if args.dev:
         _DEV = True
 
+    try:
+        app = metrics.create_app(config_dict, config_file)
+    except ValueError as exc:
+        logger.critical(f"Cannot create exporter: {exc}")
+        sys.exit(1)
+
     try:
         listen = config_dict["http_server"]["listen"]
     except (TypeError, KeyError):
@@ -122,16 +128,17 @@ This is free software, and you are welcome to redistribute it under certain cond
                 return self.application
 
         server_args = {
-            "workers": 4,  # Don't run multiple workers since we don't have shared variables yet (multiprocessing.cpu_count() * 2) + 1,
+            # Only one worker polls Altaro API, others serve the snapshot it shares through a file
+            "workers": 4,
             "bind": f"{listen}:{port}" if listen else "0.0.0.0:9769",
             "worker_class": "uvicorn.workers.UvicornWorker",
         }
 
     try:
         if _DEV or os.name == "nt":
-            uvicorn.run("altaro_exporter.metrics:app", **server_args)
+            uvicorn.run(app, **server_args)
         else:
-            StandaloneApplication(metrics.app, server_args).run()
+            StandaloneApplication(app, server_args).run()
     except KeyboardInterrupt as exc:
         logger.error("Program interrupted by keyoard: {}".format(exc))
         sys.exit(200)
@@ -0,0 +1,235 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.aggregates"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Dict, Iterator, Tuple
+from logging import getLogger
+from prometheus_client.core import GaugeMetricFamily
+from altaro_exporter.records import VMRecord
+
+
+logger = getLogger()
+
+
+# Label values of result codes 0 to 4 from _convert_result()
+RESULT_STATES = ("success", "warning", "error", "unknown", "other")
+
+# VMRecord attribute prefix, job name used in descriptions
+JOBS = (("lastbackup", "backup"), ("lastoffsitecopy", "offsite copy"))
+
+# Metric name suffix, description, JobAggregate attribute
+JOB_METRICS = (
+    (
+        "transfersize_compressed_bytes",
+        "Sum of compressed sizes of last {job}",
+        "compressed",
+    ),
+    (
+        "transfersize_uncompressed_bytes",
+        "Sum of uncompressed sizes of last {job}",
+        "uncompressed",
+    ),
+    ("duration_max_seconds", "Longest duration of last {job}", "max_duration"),
+    (
+        "duration_p95_seconds",
+        "95th percentile of durations of last {job}",
+        "p95_duration",
+    ),
+    ("oldest_timestamp", "Timestamp of the oldest last {job}", "oldest"),
+)
+
+# Scope, labels, description of the group
+SCOPES = (
+    ("host", ["server", "hostname"], "VMs of a Hyper-V / VMware host"),
+    ("fleet", ["server"], "all VMs of an Altaro server"),
+)
+
+
+class JobAggregate:
+    """
+    Totals of the last backup or offsite copy of a group of VMs
+    """
+
+    __slots__ = (
+        "results",
+        "compressed",
+        "uncompressed",
+        "durations",
+        "oldest",
+        "max_duration",
+        "p95_duration",
+    )
+
+    def __init__(self):
+        self.results = [0] * len(RESULT_STATES)
+        self.compressed = 0
+        self.uncompressed = 0
+        self.durations = []
+        self.oldest = None
+        self.max_duration = None
+        self.p95_duration = None
+
+    def add(self, result, compressed, uncompressed, duration, timestamp):
+        if result is not None:
+            self.results[result] += 1
+        if compressed:
+            self.compressed += compressed
+        if uncompressed:
+            self.uncompressed += uncompressed
+        if duration is not None:
+            self.durations.append(duration)
+        if timestamp is not None and (self.oldest is None or timestamp < self.oldest):
+            self.oldest = timestamp
+
+    def merge(self, other: "JobAggregate"):
+        for index, count in enumerate(other.results):
+            self.results[index] += count
+        self.compressed += other.compressed
+        self.uncompressed += other.uncompressed
+        self.durations.extend(other.durations)
+        if other.oldest is not None and (
+            self.oldest is None or other.oldest < self.oldest
+        ):
+            self.oldest = other.oldest
+
+    def finish(self):
+        if self.durations:
+            self.durations.sort()
+            self.max_duration = self.durations[-1]
+            # Nearest rank percentile
+            self.p95_duration = self.durations[
+                max(-(-len(self.durations) * 95 // 100) - 1, 0)
+            ]
+
+
+class Aggregate:
+    """
+    Totals of a group of VMs
+    """
+
+    __slots__ = ("vms", "lastbackup", "lastoffsitecopy")
+
+    def __init__(self):
+        self.vms = 0
+        self.lastbackup = JobAggregate()
+        self.lastoffsitecopy = JobAggregate()
+
+    def add(self, vm: VMRecord):
+        self.vms += 1
+        self.lastbackup.add(
+            vm.lastbackup_result,
+            vm.lastbackup_transfersize_compressed,
+            vm.lastbackup_transfersize_uncompressed,
+            vm.lastbackup_duration,
+            vm.lastbackup_timestamp,
+        )
+        self.lastoffsitecopy.add(
+            vm.lastoffsitecopy_result,
+            vm.lastoffsitecopy_transfersize_compressed,
+            vm.lastoffsitecopy_transfersize_uncompressed,
+            vm.lastoffsitecopy_duration,
+            vm.lastoffsitecopy_timestamp,
+        )
+
+    def merge(self, other: "Aggregate"):
+        self.vms += other.vms
+        self.lastbackup.merge(other.lastbackup)
+        self.lastoffsitecopy.merge(other.lastoffsitecopy)
+
+    def finish(self):
+        self.lastbackup.finish()
+        self.lastoffsitecopy.finish()
+
+
+class Aggregates:
+    """
+    Per host and per Altaro server totals, fed VM by VM while the collector walks VMs
+    so dashboards and alerts get low cardinality series without PromQL over every VM series
+    """
+
+    def __init__(self, per_host: bool = True):
+        self.per_host = per_host
+        # (server, hostname): Aggregate
+        self.hosts: Dict[Tuple[str, str], Aggregate] = {}
+        # server: Aggregate, filled from host ones once all VMs were added
+        self.fleets: Dict[str, Aggregate] = {}
+
+    def server(self, server: str):
+        """
+        Declare a server so it gets fleet series even without VMs
+        """
+        if server not in self.fleets:
+            self.fleets[server] = Aggregate()
+
+    def host(self, server: str, hostname: str) -> Aggregate:
+        key = (server, hostname)
+        aggregate = self.hosts.get(key)
+        if aggregate is None:
+            aggregate = self.hosts[key] = Aggregate()
+        return aggregate
+
+    def _groups(self) -> Iterator[Tuple[str, list, Aggregate]]:
+        """
+        Yields scope, label values, finished Aggregate of every host, then of every server
+        """
+        for (server, hostname), aggregate in self.hosts.items():
+            self.server(server)
+            self.fleets[server].merge(aggregate)
+            if self.per_host:
+                aggregate.finish()
+                yield "host", [server, hostname], aggregate
+        for server, aggregate in self.fleets.items():
+            aggregate.finish()
+            yield "fleet", [server], aggregate
+
+    @staticmethod
+    def _families() -> Dict[str, Dict[str, GaugeMetricFamily]]:
+        families = {}
+        for scope, labels, group in SCOPES:
+            scope_families = families[scope] = {}
+            scope_families["vms"] = GaugeMetricFamily(
+                f"altaro_{scope}_vms", f"Number of {group}", labels=labels
+            )
+            for job, job_name in JOBS:
+                scope_families[f"{job}_result"] = GaugeMetricFamily(
+                    f"altaro_{scope}_{job}_result_vms",
+                    f"Number of {group} by result of last {job_name}",
+                    labels=labels + ["result"],
+                )
+                for suffix, description, _ in JOB_METRICS:
+                    scope_families[f"{job}_{suffix}"] = GaugeMetricFamily(
+                        f"altaro_{scope}_{job}_{suffix}",
+                        f"{description.format(job=job_name)} of {group}",
+                        labels=labels,
+                    )
+        return families
+
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        for scope_families in self._families().values():
+            yield from scope_families.values()
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        families = self._families()
+        for scope, labels, aggregate in self._groups():
+            scope_families = families[scope]
+            scope_families["vms"].add_metric(labels, aggregate.vms)
+            for job, _ in JOBS:
+                job_aggregate = getattr(aggregate, job)
+                for state, count in zip(RESULT_STATES, job_aggregate.results):
+                    scope_families[f"{job}_result"].add_metric(labels + [state], count)
+                for suffix, _, key in JOB_METRICS:
+                    value = getattr(job_aggregate, key)
+                    if value is not None:
+                        scope_families[f"{job}_{suffix}"].add_metric(labels, value)
+        for scope_families in families.values():
+            yield from scope_families.values()
@@ -11,25 +11,37 @@ __copyright__ = "Copyright (C) 2024-2025 NetInvent"
 __license__ = "GPL-3.0-only"
 __build__ = "2024110501"
 
+from typing import Callable
 from ofunctions.requestor import Requestor
 from ofunctions.misc import fn_name
 from logging import getLogger
 import time
-import datetime
+import asyncio
 import requests
-from prometheus_client import Summary, Gauge, Enum, REGISTRY
-
-# from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, REGISTRY
-
+import httpx
 from altaro_exporter.__debug__ import _DEBUG
+from altaro_exporter.timestamps import parse_altaro_time
+from altaro_exporter.records import VMRecord
+from altaro_exporter.cardinality import VMFilter
+from altaro_exporter.instrumentation import (
+    API_FAILURES,
+    API_REAUTHENTICATIONS,
+    API_REQUEST_DURATION,
+)
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
 
 
 logger = getLogger()
 
 
-class AltaroAPI:
+class _AltaroAPIBase:
     """
-    Python bindings for Altaro API
+    Common settings and response handling for sync and async Altaro API bindings
     """
 
     def __init__(
@@ -71,115 +83,24 @@ class AltaroAPI:
         self.altaro_server_port = altaro_server_port
         self.altaro_server_address = altaro_server_address
         self.session_id = None
+        self.session_started = None
 
-        self.req = Requestor(
-            f"{self.altaro_rest_host}:{self.altaro_rest_port}",
-            cert_verify=self.cert_verify,
-            use_json=True,
-        )
-        self.req.api_session = requests.Session()
-        self.req.connected_server = (
-            f"https://{self.altaro_rest_host}:{self.altaro_rest_port}/"
-        )
-        # if not self.req.create_session(authenticated=False):
-        #    msg = f"Cannot create session to {self.altaro_rest_host}"
-        #    logger.critical(msg)
-        #    raise ValueError(msg)
-        self.req.endpoint = self.altaro_rest_path.strip("")
-
-        # Register gauges
-
-        self.gauge_altaro_api_success = Gauge(
-            "altaro_api_success",
-            "Altaro API request success 0 = success, 1 = cannot connect, 2 = api error",
-        )
-
-        self.gauge_lastbackup = Gauge(
-            "altaro_lastbackup_timestamp",
-            "Timestamp of last backup",
-            ["vmname", "hostname", "vmuuid"],
-        )
-        self.gauge_lastoffsitecopy = Gauge(
-            "altaro_lastoffsitecopy_timestamp",
-            "Timestamp of last offsite copy",
-            ["vmname", "hostname", "vmuuid"],
-        )
-
-        self.gauge_lastbackup_duration = Gauge(
-            "altaro_lastbackup_duration_seconds",
-            "Duration of last backup",
-            ["vmname", "hostname", "vmuuid"],
-        )
-        self.gauge_lastoffsitecopy_duration = Gauge(
-            "altaro_lastoffsitecopy_duration_seconds",
-            "Duration of last offsite copy",
-            ["vmname", "hostname", "vmuuid"],
-        )
-
-        self.gauge_lastbackup_transfersize_compressed = Gauge(
-            "altaro_lastbackup_transfersize_compressed_bytes",
-            "Compressed size of last backup",
-            ["vmname", "hostname", "vmuuid"],
-        )
-        self.gauge_lastbackup_transfersize_uncompressed = Gauge(
-            "altaro_lastbackup_transfersize_uncompressed_bytes",
-            "Unompressed size of last backup",
-            ["vmname", "hostname", "vmuuid"],
-        )
-
-        self.gauge_lastoffsitecopy_transfersize_compressed = Gauge(
-            "altaro_lastoffsitecopy_transfersize_compressed_bytes",
-            "Compressed size of last offsite copy",
-            ["vmname", "hostname", "vmuuid"],
-        )
-        self.gauge_lastoffsitecopy_transfersize_uncompressed = Gauge(
-            "altaro_lastoffsitecopy_transfersize_uncompressed_bytes",
-            "Uncompressed size of last offsite copy",
-            ["vmname", "hostname", "vmuuid"],
-        )
-        self.gauge_lastbackup_result = Gauge(
-            "altaro_lastbackup_result",
-            "Result of last backup 0 = success, 1 = warning, 2 = error, 3 = unknown, 4 = other errors",
-            ["vmname", "hostname", "vmuuid"],
-        )
-
-        self.gauge_lastoffsitecopy_result = Gauge(
-            "altaro_lastoffsitecopy_result",
-            "Result of last offsite copy 0 = success, 1 = warning, 2 = error, 3 = unknown, 4 = other errors",
-            ["vmname", "hostname", "vmuuid"],
-        )
-
-        # Create a metric to track time spent and requests made.
-        REQUEST_TIME = Summary(
-            "request_processing_seconds", "Time spent processing request"
-        )
-
-    def reset_vm_metrics(self):
-        collectors = tuple(REGISTRY._collector_to_names.keys())
-        for collector in collectors:
-            try:
-                collector._metrics.clear()
-                collector._metric_init()
-            except AttributeError:
-                pass  # built-in collectors don't inherit from MetricsWrapperBase
+        # 0 = success, 1 = cannot connect, 2 = api error, None when no request was made yet
+        self.api_success = None
 
-    def authenticate(self, action: str = "login"):
+    def _auth_payload(self) -> dict:
         logger.info(
             f"Logging in as: {self.username} on server {self.altaro_server_address}:{self.altaro_server_port} via api {self.altaro_rest_host}:{self.altaro_rest_port}"
         )
-        payload = {
+        return {
             "ServerPort": self.altaro_server_port,
             "ServerAddress": self.altaro_server_address,
             "Username": self.username,
             "Password": self.password,
             "Domain": self.domain,
         }
-        if action == "login":
-            endpoint = self.req.endpoint + "/sessions/start"
-        else:
-            endpoint = self.req.endpoint + "/sessions/end"
 
-        result = self.req.requestor(action="create", data=payload, endpoint=endpoint)
+    def _handle_auth_result(self, result, action: str):
         if not result:
             try:
                 logger.error(f"Request failed with: {result}")
@@ -200,11 +121,81 @@ class AltaroAPI:
             if action == "login":
                 logger.info("Session established")
                 self.session_id = result["Data"]
+                self.session_started = time.time()
             if action == "logout":
                 logger.info("Session closed")
                 self.session_id = None
+                self.session_started = None
         return result
 
+    def _vms_from_result(
+        self, result, include_non_scheduled: bool, vm_filter: VMFilter = None
+    ):
+        """
+        Returns the list of VM objects from a vms/list result, or False if the API call failed
+        """
+        if result is False:
+            logger.error("Could not list VMs")
+            return False
+        logger.info("VMs listed successfully")
+        vms = result["VirtualMachines"]
+        if not vms:
+            logger.error("No VM data found in request:\n{vms}")
+            return []
+
+        return [
+            vm for vm in vms if self._vm_is_wanted(vm, include_non_scheduled, vm_filter)
+        ]
+
+    def _vm_is_wanted(
+        self, vm: dict, include_non_scheduled: bool, vm_filter: VMFilter = None
+    ) -> bool:
+        vmname = vm["VirtualMachineName"]
+        hostname = vm["HostName"]
+        if vm_filter and not vm_filter.wanted(vmname, hostname):
+            logger.debug(f"Skipping VM {vmname} on {hostname} as it is filtered out")
+            return False
+        is_scheduled = vm["NextBackupTime"] or vm["NextOffsiteCopyTime"]
+        if not is_scheduled and not include_non_scheduled:
+            logger.info(f"Skipping VM {vmname} on {hostname} as it is not scheduled")
+            return False
+        logger.info(f"Found VM {vmname} on {hostname}")
+        return True
+
+
+class AltaroAPI(_AltaroAPIBase):
+    """
+    Python bindings for Altaro API
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.req = Requestor(
+            f"{self.altaro_rest_host}:{self.altaro_rest_port}",
+            cert_verify=self.cert_verify,
+            use_json=True,
+        )
+        self.req.api_session = requests.Session()
+        self.req.connected_server = (
+            f"https://{self.altaro_rest_host}:{self.altaro_rest_port}/"
+        )
+        # if not self.req.create_session(authenticated=False):
+        #    msg = f"Cannot create session to {self.altaro_rest_host}"
+        #    logger.critical(msg)
+        #    raise ValueError(msg)
+        self.req.endpoint = self.altaro_rest_path.strip("")
+
+    def authenticate(self, action: str = "login"):
+        payload = self._auth_payload()
+        if action == "login":
+            endpoint = self.req.endpoint + "/sessions/start"
+        else:
+            endpoint = self.req.endpoint + "/sessions/end"
+
+        result = self.req.requestor(action="create", data=payload, endpoint=endpoint)
+        return self._handle_auth_result(result, action)
+
     def _api_request(
         self, pre_endpoint: str, post_endpoint: str = "", action: str = "read"
     ):
@@ -227,7 +218,7 @@ class AltaroAPI:
             )
             if not result:
                 logger.error(f"API call from {fn_name(1)} failed with: {result}")
-                self.gauge_altaro_api_success.set(1)
+                self.api_success = 1
                 return False
         if not result["Success"]:
             if "Invalid Token" in result["ErrorMessage"]:
@@ -241,137 +232,349 @@ class AltaroAPI:
                     logger.error(
                         f"API call from {fn_name(1)} succeed but response failed with: {result['ErrorMessage']}"
                     )
-                self.gauge_altaro_api_success.set(2)
+                self.api_success = 2
                 return False
-        self.gauge_altaro_api_success.set(0)
+        self.api_success = 0
         return result
 
     def list_vms(
-        self, include_unconfigured: bool = False, include_non_scheduled: bool = False
+        self,
+        include_unconfigured: bool = False,
+        include_non_scheduled: bool = False,
+        vm_filter: VMFilter = None,
     ):
+        """
+        Returns a list of VM objects as sent by Altaro API, or False if the API call failed
+        Use parse_vm() to convert them to exported values
+        """
         result = self._api_request(
             pre_endpoint=f"/{self.altaro_rest_path}/vms/list/",
             post_endpoint="/1" if not include_unconfigured else "",
         )
-        if result is False:
-            logger.error("Could not list VMs")
-            return False
-        logger.info("VMs listed successfully")
-        vms = result["VirtualMachines"]
-        if not vms:
-            logger.error("No VM data found in request:\n{vms}")
-            return True
-
-        for vm in vms:
-            vmname = vm["VirtualMachineName"]
-            hostname = vm["HostName"]
-            vmuuid = vm["HypervisorVirtualMachineUuid"]
-            is_scheduled = vm["NextBackupTime"] or vm["NextOffsiteCopyTime"]
-            if not is_scheduled and not include_non_scheduled:
-                logger.info(
-                    f"Skipping VM {vmname} on {hostname} as it is not scheduled"
-                )
-                continue
-            logger.info(f"Found VM {vmname} on {hostname}")
-
-            # Last Backup, ex 2024-08-13-01-53-14
-            LastBackupTime = vm["LastBackupTime"]
-            if LastBackupTime:
-                timestamp = float(
-                    time.mktime(
-                        datetime.datetime.strptime(
-                            LastBackupTime, "%Y-%m-%d-%H-%M-%S"
-                        ).timetuple()
-                    )
-                )
-                self.gauge_lastbackup.labels(vmname, hostname, vmuuid).set(timestamp)
-
-            # Last Offsite Copy
-            LastOffsiteCopyTime = vm["LastOffsiteCopyTime"]
-            if LastOffsiteCopyTime:
-                timestamp = float(
-                    time.mktime(
-                        datetime.datetime.strptime(
-                            LastOffsiteCopyTime, "%Y-%m-%d-%H-%M-%S"
-                        ).timetuple()
-                    )
-                )
-                self.gauge_lastoffsitecopy.labels(vmname, hostname, vmuuid).set(
-                    timestamp
-                )
+        return self._vms_from_result(result, include_non_scheduled, vm_filter)
+
 
-            # LastBackupDuration in Seconds
-            self.gauge_lastbackup_duration.labels(vmname, hostname, vmuuid).set(
-                vm["LastBackupDuration"]
+class AsyncAltaroAPI(_AltaroAPIBase):
+    """
+    Asyncio bindings for Altaro API, so API calls never block the event loop
+    Uses a pooled keep-alive httpx client with explicit timeouts
+    """
+
+    def __init__(
+        self,
+        *args,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+        max_connections: int = 4,
+        stream_parse: bool = False,
+        name: str = None,
+        altaro_rest_scheme: str = "https",
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        # Server label of self instrumentation metrics
+        self.name = name or self.altaro_rest_host
+        if stream_parse and not ijson:
+            logger.warning("Streaming JSON parsing needs ijson package, disabling it")
+            stream_parse = False
+        self.stream_parse = stream_parse
+        self.altaro_rest_scheme = altaro_rest_scheme
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.rest_path = "/" + self.altaro_rest_path.strip("/")
+        self._client = None
+        self._session_lock = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Client is created lazily so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.altaro_rest_scheme}://{self.altaro_rest_host}:{self.altaro_rest_port}",
+                verify=self.cert_verify,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
             )
+        return self._client
+
+    @property
+    def session_lock(self) -> asyncio.Lock:
+        # Created lazily so it binds to the running event loop
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        return self._session_lock
 
-            # LastOffsiteCopyDuration in Seconds
-            self.gauge_lastoffsitecopy_duration.labels(vmname, hostname, vmuuid).set(
-                vm["LastOffsiteCopyDuration"]
+    async def renew_session(self):
+        """
+        Logout / login once API calls in flight are done with the current session
+        """
+        async with self.session_lock:
+            await self.authenticate(action="logout")
+            await self.authenticate(action="login")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _request_failed(self, endpoint: str, exc: Exception):
+        if isinstance(exc, httpx.HTTPStatusError):
+            cause = "http"
+            logger.error(
+                f"Request to {endpoint} failed with HTTP {exc.response.status_code}"
             )
+        elif isinstance(exc, httpx.HTTPError):
+            cause = "timeout" if isinstance(exc, httpx.TimeoutException) else "connect"
+            logger.error(
+                f"Cannot establish a session. Looks like we cannot reach the server: {exc}"
+            )
+        else:
+            cause = "decode"
+            logger.error(f"Cannot decode response from {endpoint}: {exc}")
+        logger.debug("Trace:", exc_info=True)
+        API_FAILURES.labels(self.name, cause).inc()
 
-            # LastOffsiteCopyTransferSizeCompressed in Bytes
-            self.gauge_lastoffsitecopy_transfersize_compressed.labels(
-                vmname, hostname, vmuuid
-            ).set(vm["LastOffsiteCopyTransferSizeCompressed"])
+    async def _request(
+        self, method: str, endpoint: str, payload: dict = None, metric_endpoint=None
+    ):
+        """
+        Returns decoded JSON response, or False on any connection / HTTP error
+        metric_endpoint is the endpoint name latency is recorded under, ex vms/list
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, endpoint, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as exc:
+            self._request_failed(endpoint, exc)
+            return False
+        finally:
+            if metric_endpoint:
+                API_REQUEST_DURATION.labels(self.name, metric_endpoint).observe(
+                    time.perf_counter() - start
+                )
 
-            # LastOffsiteCopyTransferSizeUncompressed in Bytes
-            self.gauge_lastoffsitecopy_transfersize_uncompressed.labels(
-                vmname, hostname, vmuuid
-            ).set(vm["LastOffsiteCopyTransferSizeUncompressed"])
+    async def _request_stream(self, endpoint: str, on_vm: Callable):
+        """
+        GET a vms/list endpoint and parse the response while it downloads
+        Every VM object is handed to on_vm as soon as it is complete, so it is never held in memory as a whole
+        Returns the response without VirtualMachines, or False on any connection / HTTP / JSON error
+        """
+        result = {"Success": False, "ErrorMessage": None}
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        builder = None
+
+        def _handle_events():
+            nonlocal builder
+
+            for prefix, event, value in events:
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == "VirtualMachines.item" and event == "end_map":
+                        on_vm(builder.value)
+                        builder = None
+                elif prefix == "VirtualMachines.item" and event == "start_map":
+                    builder = ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix in ("Success", "ErrorMessage"):
+                    result[prefix] = value
+            del events[:]
+
+        start = time.perf_counter()
+        try:
+            async with self.client.stream("GET", endpoint) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    parser.send(chunk)
+                    _handle_events()
+            parser.close()
+            _handle_events()
+            return result
+        except (httpx.HTTPError, ijson.JSONError) as exc:
+            self._request_failed(endpoint, exc)
+            return False
+        finally:
+            API_REQUEST_DURATION.labels(self.name, "vms/list").observe(
+                time.perf_counter() - start
+            )
 
-            # LastBackupTransferSizeCompressed in Bytes
-            self.gauge_lastbackup_transfersize_compressed.labels(
-                vmname, hostname, vmuuid
-            ).set(vm["LastBackupTransferSizeCompressed"])
+    async def _get(self, endpoint: str, stream_handler: Callable = None):
+        if stream_handler:
+            return await self._request_stream(endpoint, stream_handler)
+        return await self._request("GET", endpoint, metric_endpoint="vms/list")
 
-            # LastBackupTransferSizeUncompressed in Bytes
-            self.gauge_lastbackup_transfersize_uncompressed.labels(
-                vmname, hostname, vmuuid
-            ).set(vm["LastBackupTransferSizeUncompressed"])
+    async def _reauthenticate(self):
+        API_REAUTHENTICATIONS.labels(self.name).inc()
+        await self.authenticate(action="logout")
+        await self.authenticate(action="login")
 
-            # LastBackupResult
-            try:
-                if vm["LastBackupResult"].lower() == "success":
-                    last_backup_result = 0
-                elif vm["LastBackupResult"].lower() == "warning":
-                    last_backup_result = 1
-                elif vm["LastBackupResult"].lower() == "error":
-                    last_backup_result = 2
-                elif vm["LastBackupResult"].lower() == "unknown":
-                    last_backup_result = 3
-                elif vm["LastBackupResult"] is not None:
-                    last_backup_result = 4
-                else:
-                    last_backup_result = None
-                if last_backup_result is not None:
-                    self.gauge_lastbackup_result.labels(vmname, hostname, vmuuid).set(
-                        last_backup_result
+    async def authenticate(self, action: str = "login"):
+        payload = self._auth_payload()
+        if action == "login":
+            metric_endpoint = "sessions/start"
+        else:
+            metric_endpoint = "sessions/end"
+        endpoint = f"{self.rest_path}/{metric_endpoint}"
+
+        result = await self._request(
+            "POST", endpoint, payload, metric_endpoint=metric_endpoint
+        )
+        return self._handle_auth_result(result, action)
+
+    async def _api_request(
+        self,
+        pre_endpoint: str,
+        post_endpoint: str = "",
+        stream_handler: Callable = None,
+    ):
+        """
+        Shorthand to logout / login if session is invalid
+        Session renewals wait for calls in flight, so a call never uses a session being ended
+        """
+        async with self.session_lock:
+            if not self.session_id:
+                await self.authenticate(action="login")
+            result = await self._get(
+                f"{pre_endpoint}{self.session_id}{post_endpoint}", stream_handler
+            )
+            if not result:
+                # Let's try to logout, login just to make sure
+                logger.warning("API call failed, trying to reauthenticate")
+                await self._reauthenticate()
+                result = await self._get(
+                    f"{pre_endpoint}{self.session_id}{post_endpoint}", stream_handler
+                )
+                if not result:
+                    logger.error(f"API call from {fn_name(1)} failed with: {result}")
+                    self.api_success = 1
+                    return False
+            if not result["Success"]:
+                if "Invalid Token" in (result["ErrorMessage"] or ""):
+                    API_FAILURES.labels(self.name, "invalid_token").inc()
+                    await self._reauthenticate()
+                    result = await self._get(
+                        f"{pre_endpoint}{self.session_id}{post_endpoint}",
+                        stream_handler,
+                    )
+                if result and not result["Success"]:
+                    API_FAILURES.labels(self.name, "api_error").inc()
+                if not result or not result["Success"]:
+                    logger.error(
+                        f"API call from {fn_name(1)} succeed but response failed with: {result['ErrorMessage'] if result else result}"
                     )
-            except Exception as exc:
-                logger.info(f"{vmname} has no last backup: {exc}")
+                    self.api_success = 2
+                    return False
+            self.api_success = 0
+            return result
 
-            # LastOffsiteCopyResult
-            try:
-                if vm["LastOffsiteCopyResult"].lower() == "success":
-                    last_offsite_backup_result = 0
-                elif vm["LastOffsiteCopyResult"].lower() == "warning":
-                    last_offsite_backup_result = 1
-                elif vm["LastOffsiteCopyResult"].lower() == "error":
-                    last_offsite_backup_result = 2
-                elif vm["LastOffsiteCopyResult"].lower() == "unknown":
-                    last_offsite_backup_result = 3
-                elif vm["LastOffsiteCopyResult"] is not None:
-                    last_offsite_backup_result = 4
-                else:
-                    last_offsite_backup_result = None
-                if last_offsite_backup_result is not None:
-                    self.gauge_lastoffsitecopy_result.labels(
-                        vmname, hostname, vmuuid
-                    ).set(last_offsite_backup_result)
-            except Exception as exc:
-                logger.info(f"{vmname} has no lastoffsitecopy: {exc}")
-        return True
+    async def list_vms(
+        self,
+        include_unconfigured: bool = False,
+        include_non_scheduled: bool = False,
+        on_vm: Callable = None,
+        vm_filter: VMFilter = None,
+    ):
+        """
+        Returns a list of VM objects as sent by Altaro API, or False if the API call failed
+        Use parse_vm() to convert them to exported values
+
+        VMs not matching vm_filter are skipped before being parsed
+        When on_vm is given, VM objects are handed to it one by one and an empty list is returned
+        With stream_parse, this happens while the response is still being downloaded
+        """
+        pre_endpoint = f"{self.rest_path}/vms/list/"
+        post_endpoint = "/1" if not include_unconfigured else ""
+        if on_vm and self.stream_parse:
+
+            def _on_vm(vm: dict):
+                if self._vm_is_wanted(vm, include_non_scheduled, vm_filter):
+                    on_vm(vm)
+
+            result = await self._api_request(
+                pre_endpoint=pre_endpoint,
+                post_endpoint=post_endpoint,
+                stream_handler=_on_vm,
+            )
+            if result is False:
+                logger.error("Could not list VMs")
+                return False
+            logger.info("VMs listed successfully")
+            return []
+
+        result = await self._api_request(
+            pre_endpoint=pre_endpoint, post_endpoint=post_endpoint
+        )
+        vms = self._vms_from_result(result, include_non_scheduled, vm_filter)
+        if on_vm and vms is not False:
+            for vm in vms:
+                on_vm(vm)
+            return []
+        return vms
+
+
+def _convert_result(result: str):
+    """
+    Converts Altaro job result to 0 = success, 1 = warning, 2 = error, 3 = unknown, 4 = other errors
+    """
+    if result is None:
+        return None
+    result = result.lower()
+    if result == "success":
+        return 0
+    if result == "warning":
+        return 1
+    if result == "error":
+        return 2
+    if result == "unknown":
+        return 3
+    return 4
+
+
+def parse_vm(vm: dict) -> VMRecord:
+    """
+    Converts a VM object from vms/list into the values we export
+    """
+    lastbackup_timestamp = parse_altaro_time(vm["LastBackupTime"])
+    lastoffsitecopy_timestamp = parse_altaro_time(vm["LastOffsiteCopyTime"])
+    lastbackup_result = _convert_result(vm["LastBackupResult"])
+    lastoffsitecopy_result = _convert_result(vm["LastOffsiteCopyResult"])
+    return VMRecord(
+        vmname=vm["VirtualMachineName"],
+        hostname=vm["HostName"],
+        vmuuid=vm["HypervisorVirtualMachineUuid"],
+        lastbackup_timestamp=lastbackup_timestamp,
+        lastoffsitecopy_timestamp=lastoffsitecopy_timestamp,
+        # Durations in seconds
+        lastbackup_duration=vm["LastBackupDuration"],
+        lastoffsitecopy_duration=vm["LastOffsiteCopyDuration"],
+        # Transfer sizes in bytes
+        lastbackup_transfersize_compressed=vm["LastBackupTransferSizeCompressed"],
+        lastbackup_transfersize_uncompressed=vm["LastBackupTransferSizeUncompressed"],
+        lastoffsitecopy_transfersize_compressed=vm[
+            "LastOffsiteCopyTransferSizeCompressed"
+        ],
+        lastoffsitecopy_transfersize_uncompressed=vm[
+            "LastOffsiteCopyTransferSizeUncompressed"
+        ],
+        lastbackup_result=lastbackup_result,
+        lastoffsitecopy_result=lastoffsitecopy_result,
+        # Not exported, used to schedule polls around backup jobs
+        nextbackup_timestamp=parse_altaro_time(vm["NextBackupTime"]),
+        nextoffsitecopy_timestamp=parse_altaro_time(vm["NextOffsiteCopyTime"]),
+        # Warnings still leave a restore point, older successes are carried over by VMInventory
+        lastsuccessfulbackup_timestamp=(
+            lastbackup_timestamp if lastbackup_result in (0, 1) else None
+        ),
+        lastsuccessfuloffsitecopy_timestamp=(
+            lastoffsitecopy_timestamp if lastoffsitecopy_result in (0, 1) else None
+        ),
+    )
 
 
 """
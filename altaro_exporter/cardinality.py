@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.cardinality"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, List, Optional, Pattern, Union
+from logging import getLogger
+from fnmatch import fnmatchcase
+from functools import lru_cache
+import hashlib
+import re
+
+
+logger = getLogger()
+
+
+KEEP = "keep"
+HASH = "hash"
+DROP = "drop"
+
+# Per VM labels that can be hashed or dropped, in exported order after server
+VM_LABEL_NAMES = ("vmname", "hostname", "vmuuid")
+
+
+def _compile(patterns: Union[None, str, Iterable[str]], name: str) -> Optional[Pattern]:
+    """
+    Compile a regex or a list of regexes into a single pattern, None if there are none
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    try:
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+    except re.error as exc:
+        raise ValueError(f"Invalid {name} regex: {exc}")
+
+
+class VMFilter:
+    """
+    Regex rules on VM and host names, compiled once when loading config and applied while parsing vms/list
+    Regexes must match whole names, a VM is kept when it matches an include regex (if any) and no exclude regex
+    """
+
+    def __init__(
+        self,
+        include_vmname: Union[None, str, List[str]] = None,
+        exclude_vmname: Union[None, str, List[str]] = None,
+        include_hostname: Union[None, str, List[str]] = None,
+        exclude_hostname: Union[None, str, List[str]] = None,
+    ):
+        self.include_vmname = _compile(include_vmname, "include_vmname")
+        self.exclude_vmname = _compile(exclude_vmname, "exclude_vmname")
+        self.include_hostname = _compile(include_hostname, "include_hostname")
+        self.exclude_hostname = _compile(exclude_hostname, "exclude_hostname")
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.include_vmname
+            or self.exclude_vmname
+            or self.include_hostname
+            or self.exclude_hostname
+        )
+
+    def wanted(self, vmname: str, hostname: str) -> bool:
+        vmname = vmname or ""
+        hostname = hostname or ""
+        if self.include_vmname and not self.include_vmname.fullmatch(vmname):
+            return False
+        if self.include_hostname and not self.include_hostname.fullmatch(hostname):
+            return False
+        if self.exclude_vmname and self.exclude_vmname.fullmatch(vmname):
+            return False
+        if self.exclude_hostname and self.exclude_hostname.fullmatch(hostname):
+            return False
+        return True
+
+
+@lru_cache(maxsize=1 << 17)
+def hash_label(value: Optional[str]) -> Optional[str]:
+    """
+    Short stable hash of a label value, values repeat scrape after scrape hence the cache
+    """
+    if value is None:
+        return None
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SeriesRules:
+    """
+    Which per VM labels are kept, hashed or dropped, and which metric families aren't exported at all
+    Dropped labels must leave series unique, ex vmuuid when VM names are unique
+    disabled_metrics are metric names, shell wildcards allowed, ex altaro_lastoffsitecopy_*
+    """
+
+    def __init__(
+        self, labels: Optional[dict] = None, disabled_metrics: Iterable[str] = ()
+    ):
+        labels = labels or {}
+        for label, action in labels.items():
+            if label not in VM_LABEL_NAMES:
+                raise ValueError(
+                    f"Label {label} cannot be changed, only {', '.join(VM_LABEL_NAMES)} can"
+                )
+            if action not in (KEEP, HASH, DROP):
+                raise ValueError(
+                    f"Bogus action {action} for label {label}, use {KEEP}, {HASH} or {DROP}"
+                )
+        self.actions = {label: labels.get(label, KEEP) for label in VM_LABEL_NAMES}
+        # VMRecord attribute and action of labels exported, in order
+        self._labels = tuple(
+            (label, action) for label, action in self.actions.items() if action != DROP
+        )
+        self.disabled_metrics = tuple(disabled_metrics or ())
+
+    @property
+    def identity(self) -> bool:
+        """
+        Whether labels are exported as is
+        """
+        return all(action == KEEP for action in self.actions.values())
+
+    def label_names(self) -> List[str]:
+        return ["server"] + [label for label, _ in self._labels]
+
+    def label_values(self, server: str, vm) -> List[str]:
+        """
+        Exported label values of a VM, null values being exported as empty strings
+        """
+        values = [server]
+        for label, action in self._labels:
+            value = getattr(vm, label)
+            values.append((hash_label(value) if action == HASH else value) or "")
+        return values
+
+    def label_value(self, label: str, value: Optional[str]) -> Optional[str]:
+        """
+        Exported value of a single label, None if it's dropped
+        """
+        action = self.actions[label]
+        if action == DROP:
+            return None
+        if action == HASH:
+            return hash_label(value) or ""
+        return value or ""
+
+    def enabled(self, metric_name: str) -> bool:
+        return not any(
+            fnmatchcase(metric_name, pattern) for pattern in self.disabled_metrics
+        )
+
+    def family_enabled(self, family) -> bool:
+        """
+        Whether a metric family is exported, counter families are named without _total
+        but disabled_metrics may use either name
+        """
+        if not self.enabled(family.name):
+            return False
+        return family.type != "counter" or self.enabled(f"{family.name}_total")
@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.circuit_breaker"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from logging import getLogger
+import random
+import time
+from prometheus_client import Counter, Gauge
+
+
+logger = getLogger()
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Values of altaro_circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+BREAKER_STATE = Gauge(
+    "altaro_circuit_breaker_state",
+    "Circuit breaker state of Altaro server 0 = closed, 1 = open, 2 = half open",
+    ["server"],
+)
+BREAKER_TRANSITIONS = Counter(
+    "altaro_circuit_breaker_transitions",
+    "Number of circuit breaker transitions by state entered",
+    ["server", "state"],
+)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an Altaro server after failure_threshold consecutive failed polls
+    While open, calls fail fast until a backoff delay expires, then a single call probes the server (half open)
+    A successful probe closes the breaker, a failed one reopens it with twice the delay, up to max_backoff
+    Delays are randomized by +/- jitter so exporters sharing an Altaro server don't probe in lockstep
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        base_backoff: float = 30,
+        max_backoff: float = 900,
+        jitter: float = 0.2,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.state = CLOSED
+        self.failures = 0
+        # Number of times the breaker opened since it was last closed
+        self.openings = 0
+        self.retry_at = None
+        BREAKER_STATE.labels(self.name).set(STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.info(f"Circuit breaker of {self.name} goes from {self.state} to {state}")
+        self.state = state
+        BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+        BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def backoff(self) -> float:
+        delay = min(
+            self.base_backoff * 2 ** max(self.openings - 1, 0), self.max_backoff
+        )
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go through now, moves an open breaker to half open once its delay expired
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.retry_at:
+            self._transition(HALF_OPEN)
+            return True
+        # Only one probe at a time while half open
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.openings = 0
+        self.retry_at = None
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.openings += 1
+            delay = self.backoff()
+            self.retry_at = time.monotonic() + delay
+            logger.warning(
+                f"Altaro server {self.name} failed {self.failures} times in a row, not calling it for {delay:.0f}s"
+            )
+            self._transition(OPEN)
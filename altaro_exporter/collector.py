@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.collector"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, NamedTuple, Optional, Tuple
+from logging import getLogger
+import time
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from altaro_exporter.records import VMRecord
+from altaro_exporter.aggregates import Aggregates
+from altaro_exporter.cardinality import SeriesRules, DROP
+from altaro_exporter.policies import BackupPolicies, PolicyReport
+
+
+logger = getLogger()
+
+
+# VMRecord attribute, metric name, metric description
+VM_METRICS = (
+    ("lastbackup_timestamp", "altaro_lastbackup_timestamp", "Timestamp of last backup"),
+    (
+        "lastoffsitecopy_timestamp",
+        "altaro_lastoffsitecopy_timestamp",
+        "Timestamp of last offsite copy",
+    ),
+    (
+        "lastbackup_duration",
+        "altaro_lastbackup_duration_seconds",
+        "Duration of last backup",
+    ),
+    (
+        "lastoffsitecopy_duration",
+        "altaro_lastoffsitecopy_duration_seconds",
+        "Duration of last offsite copy",
+    ),
+    (
+        "lastbackup_transfersize_compressed",
+        "altaro_lastbackup_transfersize_compressed_bytes",
+        "Compressed size of last backup",
+    ),
+    (
+        "lastbackup_transfersize_uncompressed",
+        "altaro_lastbackup_transfersize_uncompressed_bytes",
+        "Unompressed size of last backup",
+    ),
+    (
+        "lastoffsitecopy_transfersize_compressed",
+        "altaro_lastoffsitecopy_transfersize_compressed_bytes",
+        "Compressed size of last offsite copy",
+    ),
+    (
+        "lastoffsitecopy_transfersize_uncompressed",
+        "altaro_lastoffsitecopy_transfersize_uncompressed_bytes",
+        "Uncompressed size of last offsite copy",
+    ),
+    (
+        "lastbackup_result",
+        "altaro_lastbackup_result",
+        "Result of last backup 0 = success, 1 = warning, 2 = error, 3 = unknown, 4 = other errors",
+    ),
+    (
+        "lastoffsitecopy_result",
+        "altaro_lastoffsitecopy_result",
+        "Result of last offsite copy 0 = success, 1 = warning, 2 = error, 3 = unknown, 4 = other errors",
+    ),
+)
+
+
+class ServerSnapshot(NamedTuple):
+    """
+    Result of polling one Altaro server
+    """
+
+    name: str
+    # 0 = success, 1 = cannot connect, 2 = api error
+    api_success: Optional[int]
+    vms: Tuple[VMRecord, ...]
+    success: bool
+
+
+class AltaroCollector(Collector):
+    """
+    Builds Altaro metric families straight from the latest VM snapshot at collect time
+    Avoids keeping one labelled child per series and clearing registry state between refreshes
+    Per host and per server aggregates are computed in the same walk over VMs
+
+    Series rules may hash or drop per VM labels, and disable metric families
+    Backup policies add overdue flags and ages of last successful jobs, computed at collect time
+    """
+
+    def __init__(
+        self,
+        rules: Optional[SeriesRules] = None,
+        policies: Optional[BackupPolicies] = None,
+    ):
+        self.servers = ()
+        self.rules = rules or SeriesRules()
+        self.policies = policies
+
+    def update(self, servers: Iterable[ServerSnapshot]):
+        """
+        Swap in the data the next collect() will expose
+        """
+        self.servers = tuple(servers)
+
+    def _families(self):
+        api_success = GaugeMetricFamily(
+            "altaro_api_success",
+            "Altaro API request success 0 = success, 1 = cannot connect, 2 = api error",
+            labels=["server"],
+        )
+        labels = self.rules.label_names()
+        # Disabled VM families aren't even filled
+        vm_families = [
+            (key, GaugeMetricFamily(name, description, labels=labels))
+            for key, name, description in VM_METRICS
+            if self.rules.enabled(name)
+        ]
+        return api_success, vm_families
+
+    def _aggregates(self) -> Aggregates:
+        # Host aggregates make no sense once hostname is dropped
+        return Aggregates(per_host=self.rules.actions["hostname"] != DROP)
+
+    def _policy_report(self, now: float) -> Optional[PolicyReport]:
+        if not self.policies:
+            return None
+        return PolicyReport(
+            self.policies, self.rules.label_names(), now, self.rules.enabled
+        )
+
+    def _enabled(self, families):
+        for family in families:
+            if self.rules.enabled(family.name):
+                yield family
+
+    def describe(self):
+        api_success, vm_families = self._families()
+        yield from self._enabled([api_success])
+        for _, family in vm_families:
+            yield family
+        yield from self._enabled(self._aggregates().describe())
+        report = self._policy_report(0)
+        if report:
+            yield from self._enabled(report.describe())
+
+    def collect(self):
+        api_success, vm_families = self._families()
+        for server in self.servers:
+            if server.api_success is not None:
+                api_success.add_metric([server.name], server.api_success)
+        yield from self._enabled([api_success])
+
+        rules = self.rules
+        identity = rules.identity
+        aggregates = self._aggregates()
+        report = self._policy_report(time.time())
+        for server in self.servers:
+            aggregates.server(server.name)
+            for vm in server.vms:
+                if identity:
+                    # Altaro may leave names or uuid null, label values must be strings
+                    hostname = vm.hostname or ""
+                    labels = [server.name, vm.vmname or "", hostname, vm.vmuuid or ""]
+                else:
+                    labels = rules.label_values(server.name, vm)
+                    hostname = rules.label_value("hostname", vm.hostname)
+                for key, family in vm_families:
+                    value = getattr(vm, key)
+                    if value is not None:
+                        family.add_metric(labels, value)
+                aggregates.host(server.name, hostname).add(vm)
+                if report:
+                    report.add(server.name, labels, vm)
+        for _, family in vm_families:
+            yield family
+        yield from self._enabled(aggregates.collect())
+        if report:
+            yield from self._enabled(report.collect())
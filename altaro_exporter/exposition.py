@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.exposition"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, NamedTuple, Optional, Tuple, Union
+from logging import getLogger
+import struct
+import zlib
+import prometheus_client
+from prometheus_client import REGISTRY
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+logger = getLogger()
+
+
+class Exposition(NamedTuple):
+    """
+    Prometheus exposition rendered once per refresh, in every encoding we serve
+    """
+
+    identity: bytes
+    # Complete gzip member, whose deflate stream is sync flushed before an empty final block, see append_to_body()
+    gzip: bytes
+    zstd: Optional[bytes]
+    # CRC32 of identity, needed to rewrite the gzip trailer
+    crc32: int
+
+
+# gzip header with mtime=0 so output is identical for identical content
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+# Empty fixed huffman deflate block with BFINAL set, closes a sync flushed deflate stream
+DEFLATE_EMPTY_FINAL_BLOCK = b"\x03\x00"
+# Empty final block and CRC32 / size trailer appended to the open gzip member
+GZIP_END_SIZE = len(DEFLATE_EMPTY_FINAL_BLOCK) + 8
+
+
+def _gzip_trailer(crc32: int, size: int) -> bytes:
+    return struct.pack("<II", crc32, size & 0xFFFFFFFF)
+
+
+def render_exposition(registry=REGISTRY, compress_level: int = 6) -> Exposition:
+    """
+    Render registry once and keep precompressed variants so scrapes only send bytes
+    """
+    content = prometheus_client.generate_latest(registry)
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    crc32 = zlib.crc32(content)
+    gzip_content = b"".join(
+        (
+            GZIP_HEADER,
+            compressor.compress(content),
+            compressor.flush(zlib.Z_SYNC_FLUSH),
+            DEFLATE_EMPTY_FINAL_BLOCK,
+            _gzip_trailer(crc32, len(content)),
+        )
+    )
+    if zstandard:
+        zstd_content = zstandard.ZstdCompressor(level=compress_level).compress(content)
+    else:
+        zstd_content = None
+    return Exposition(
+        identity=content,
+        gzip=gzip_content,
+        zstd=zstd_content,
+        crc32=crc32,
+    )
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_snapshot_age(
+    server_timestamps: Iterable[Tuple[str, Optional[float]]], now: float
+) -> bytes:
+    """
+    Render altaro_snapshot_age_seconds, which changes every scrape and thus can't be part of the cached exposition
+    Servers that were never polled successfully have no sample
+    """
+    lines = [
+        "# HELP altaro_snapshot_age_seconds Seconds since data of Altaro server was fetched",
+        "# TYPE altaro_snapshot_age_seconds gauge",
+    ]
+    for name, timestamp in server_timestamps:
+        if timestamp is not None:
+            lines.append(
+                f'altaro_snapshot_age_seconds{{server="{_escape_label_value(name)}"}} {max(now - timestamp, 0):.3f}'
+            )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def body_chunks(
+    exposition: Exposition, encoding: Optional[str], body: bytes, tail: bytes
+) -> Tuple[Union[bytes, memoryview], bytes]:
+    """
+    Body selected by select_encoding() followed by uncompressed tail, as two chunks to send one after the other
+    The body is neither recompressed nor copied, only the tail is compressed
+    The gzip member is reopened by cutting its empty final block and trailer, then gets the tail as
+    final deflate block and a new trailer, so it stays a single member every client can read
+    zstd frames are simply concatenated
+    """
+    if encoding == "gzip":
+        compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return (
+            memoryview(body)[:-GZIP_END_SIZE],
+            b"".join(
+                (
+                    compressor.compress(tail),
+                    compressor.flush(),
+                    _gzip_trailer(
+                        zlib.crc32(tail, exposition.crc32),
+                        len(exposition.identity) + len(tail),
+                    ),
+                )
+            ),
+        )
+    if encoding == "zstd":
+        return body, zstandard.ZstdCompressor(level=1).compress(tail)
+    return body, tail
+
+
+def append_to_body(
+    exposition: Exposition, encoding: Optional[str], body: bytes, tail: bytes
+) -> bytes:
+    """
+    Same as body_chunks(), as a single bytes object
+    """
+    return b"".join(body_chunks(exposition, encoding, body, tail))
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> dict:
+    """
+    Parse Accept-Encoding header into {encoding: qvalue}
+    """
+    encodings = {}
+    if not accept_encoding:
+        return encodings
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.strip().partition(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        qvalue = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                qvalue = float(params[2:])
+            except ValueError:
+                qvalue = 0.0
+        encodings[encoding] = qvalue
+    return encodings
+
+
+def select_encoding(
+    exposition: Exposition, accept_encoding: Optional[str]
+) -> Tuple[Optional[str], bytes]:
+    """
+    Return (content-encoding, body) best matching the client's Accept-Encoding header
+    Content-encoding is None for identity
+    """
+    encodings = _accepted_encodings(accept_encoding)
+    wildcard = encodings.get("*", 0.0)
+    candidates = []
+    if exposition.zstd is not None:
+        candidates.append(("zstd", exposition.zstd))
+    candidates.append(("gzip", exposition.gzip))
+    best = None
+    best_qvalue = 0.0
+    for encoding, body in candidates:
+        qvalue = encodings.get(encoding, wildcard)
+        if qvalue > best_qvalue:
+            best = (encoding, body)
+            best_qvalue = qvalue
+    if best:
+        return best
+    return None, exposition.identity
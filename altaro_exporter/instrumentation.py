@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.instrumentation"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Optional
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+from prometheus_client.registry import Collector
+from altaro_exporter.cardinality import SeriesRules
+
+
+# Metrics about the exporter itself, so a slow scrape can be blamed on Altaro, the network or the exporter
+API_REQUEST_DURATION = Histogram(
+    "altaro_api_request_duration_seconds",
+    "Altaro REST API request latency, response download included",
+    ["server", "endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+API_REAUTHENTICATIONS = Counter(
+    "altaro_api_reauthentications",
+    "Number of times a failed Altaro API call forced a logout / login",
+    ["server"],
+)
+# Causes: connect, timeout, http, decode, invalid_token, api_error, poll_timeout, circuit_open, unexpected
+API_FAILURES = Counter(
+    "altaro_api_failures",
+    "Number of failed Altaro API calls by cause",
+    ["server", "cause"],
+)
+REFRESH_PHASE_DURATION = Histogram(
+    "altaro_refresh_phase_duration_seconds",
+    "Time spent in each refresh phase: fetch (per server, JSON decoding included), "
+    "parse (per server), build and render",
+    ["phase"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class ProcessMetrics(Collector):
+    """
+    Metrics of the global registry: process, platform, and exporter metrics defined at module level
+    They're process wide, while every app gets its own registry for its sources
+    Families listed in disabled_metrics of the app's SeriesRules aren't forwarded
+    """
+
+    def __init__(self, rules: Optional[SeriesRules] = None):
+        self.rules = rules
+
+    def collect(self):
+        if self.rules is None or not self.rules.disabled_metrics:
+            return REGISTRY.collect()
+        return (
+            family for family in REGISTRY.collect() if self.rules.family_enabled(family)
+        )
+
+
+def create_registry(rules: Optional[SeriesRules] = None) -> CollectorRegistry:
+    """
+    New registry exposing process wide metrics, sources get registered on it
+    """
+    registry = CollectorRegistry()
+    registry.register(ProcessMetrics(rules))
+    return registry
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.inventory"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, Optional, Tuple
+from logging import getLogger
+import time
+from prometheus_client import Counter
+from altaro_exporter.altaro_api import parse_vm
+from altaro_exporter.records import VMRecord, intern_label, vm_fingerprint
+from altaro_exporter.job_counters import JobCounters
+
+
+logger = getLogger()
+
+
+VMS_ADDED = Counter(
+    "altaro_vms_added", "Number of VMs that appeared in vms/list results", ["server"]
+)
+VMS_CHANGED = Counter(
+    "altaro_vms_changed",
+    "Number of VMs whose data changed between two vms/list results",
+    ["server"],
+)
+VMS_REMOVED = Counter(
+    "altaro_vms_removed",
+    "Number of VMs retired after missing from vms/list results for the grace period",
+    ["server"],
+)
+
+
+def vm_key(vm: dict) -> str:
+    """
+    VMs are identified by their hypervisor uuid, falling back to host and name
+    """
+    uuid = vm.get("HypervisorVirtualMachineUuid")
+    if uuid:
+        return intern_label(uuid)
+    return f"{vm.get('HostName')}/{vm.get('VirtualMachineName')}"
+
+
+def record_key(record: VMRecord) -> str:
+    """
+    Same as vm_key(), from a parsed record
+    """
+    if record.vmuuid:
+        return record.vmuuid
+    return f"{record.hostname}/{record.vmname}"
+
+
+class VMInventory:
+    """
+    VM records of one Altaro server, updated incrementally from successive vms/list results
+    Only new or changed VMs get parsed, so refresh cost scales with churn rather than fleet size
+    Changed VMs are compared with their previous record to count completed jobs in JobCounters
+    """
+
+    def __init__(
+        self,
+        server: str,
+        retire_grace_period: int = 0,
+        counters: Optional[JobCounters] = None,
+    ):
+        self.server = server
+        self.retire_grace_period = retire_grace_period
+        self.counters = counters
+        if counters:
+            counters.declare(server)
+        # key: (vm_fingerprint() of the vms/list object, parsed record, last seen timestamp)
+        # Raw VM objects aren't kept, they're several times larger than the record itself
+        self._vms = {}
+        self._now = None
+        self._seen = set()
+        self._added = self._changed = 0
+        # Time spent merging VMs since begin()
+        self.parse_seconds = 0.0
+
+    def update(self, vms: Iterable[dict], now: float = None) -> Tuple[VMRecord, ...]:
+        """
+        Merge a successful vms/list result and return current VM records
+        """
+        self.begin(now)
+        for vm in vms:
+            self.add(vm)
+        return self.finish()
+
+    def begin(self, now: float = None):
+        """
+        Start merging a vms/list result whose VMs are given one by one to add()
+        Allows merging VMs as they get parsed from a streamed response
+        """
+        self._now = time.time() if now is None else now
+        self._seen = set()
+        self._added = self._changed = 0
+        self.parse_seconds = 0.0
+
+    def add(self, vm: dict):
+        start = time.perf_counter()
+        key = vm_key(vm)
+        self._seen.add(key)
+        fingerprint = vm_fingerprint(vm)
+        previous = self._vms.get(key)
+        if previous is None:
+            self._added += 1
+            self._vms[key] = (fingerprint, parse_vm(vm), self._now)
+        elif previous[0] != fingerprint:
+            if previous[0] is None:
+                # Restored record
+                self._added += 1
+            else:
+                self._changed += 1
+            record = parse_vm(vm)
+            record.keep_last_success(previous[1])
+            if self.counters:
+                self.counters.count(self.server, previous[1], record)
+            self._vms[key] = (fingerprint, record, self._now)
+        else:
+            self._vms[key] = (previous[0], previous[1], self._now)
+        self.parse_seconds += time.perf_counter() - start
+
+    def restore(self, records: Iterable[VMRecord], timestamp: float):
+        """
+        Seed an empty inventory with records saved by a previous run, so last successful job times
+        survive restarts. Restored records get parsed again on first poll, as they have no fingerprint
+        """
+        for record in records:
+            key = record_key(record)
+            if key not in self._vms:
+                self._vms[key] = (None, record, timestamp)
+
+    def finish(self) -> Tuple[VMRecord, ...]:
+        """
+        Retire VMs missing for longer than the grace period and return current VM records
+        """
+        now = self._now
+        seen = self._seen
+        removed = 0
+        for key in [key for key in self._vms if key not in seen]:
+            if now - self._vms[key][2] >= self.retire_grace_period:
+                logger.info(f"Retiring VM {key} from server {self.server}")
+                del self._vms[key]
+                removed += 1
+        self._seen = set()
+
+        if self._added:
+            VMS_ADDED.labels(self.server).inc(self._added)
+        if self._changed:
+            VMS_CHANGED.labels(self.server).inc(self._changed)
+        if removed:
+            VMS_REMOVED.labels(self.server).inc(removed)
+        logger.debug(
+            f"Server {self.server} VMs: {self._added} added, {self._changed} changed, {removed} removed"
+        )
+        return self.records
+
+    @property
+    def records(self) -> Tuple[VMRecord, ...]:
+        return tuple(entry[1] for entry in self._vms.values())
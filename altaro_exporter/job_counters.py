@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.job_counters"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from logging import getLogger
+import json
+import os
+from prometheus_client.core import CounterMetricFamily
+from altaro_exporter.records import VMRecord
+from altaro_exporter.aggregates import RESULT_STATES
+
+
+logger = getLogger()
+
+
+FORMAT_VERSION = 1
+
+# Counter name, VMRecord attribute prefix, description
+COUNTED_JOBS = (
+    ("backups", "lastbackup", "Number of backups seen completing, by result"),
+    (
+        "offsitecopies",
+        "lastoffsitecopy",
+        "Number of offsite copies seen completing, by result",
+    ),
+)
+
+
+class JobCounters:
+    """
+    Monotonic counters of completed backups and offsite copies per server and result
+    A job is counted when the last job time of a VM advances between two polls, so increase() and rate()
+    don't need changes() over every VM timestamp series
+
+    Counts are saved to a file after refreshes and added back on start, so they survive restarts
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        # (server, counter name, result): count
+        self.counts: Dict[Tuple[str, str, str], int] = {}
+        self.servers = set()
+        self._dirty = False
+
+    def declare(self, server: str):
+        """
+        Declare a server so its counters are exported from 0 before any job completes
+        """
+        self.servers.add(server)
+
+    def count(self, server: str, previous: VMRecord, record: VMRecord):
+        """
+        Count jobs that completed between two records of the same VM
+        """
+        for name, prefix, _ in COUNTED_JOBS:
+            timestamp = getattr(record, f"{prefix}_timestamp")
+            if timestamp is None:
+                continue
+            previous_timestamp = getattr(previous, f"{prefix}_timestamp")
+            if previous_timestamp is not None and timestamp <= previous_timestamp:
+                continue
+            result = getattr(record, f"{prefix}_result")
+            key = (server, name, RESULT_STATES[3 if result is None else result])
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self._dirty = True
+
+    def describe(self) -> Iterator[CounterMetricFamily]:
+        for name, _, description in COUNTED_JOBS:
+            yield CounterMetricFamily(
+                f"altaro_{name}", description, labels=["server", "result"]
+            )
+
+    def collect(self) -> Iterator[CounterMetricFamily]:
+        counts = dict(self.counts)
+        for name, _, description in COUNTED_JOBS:
+            family = CounterMetricFamily(
+                f"altaro_{name}", description, labels=["server", "result"]
+            )
+            for server in sorted(self.servers):
+                for state in RESULT_STATES:
+                    family.add_metric(
+                        [server, state], counts.get((server, name, state), 0)
+                    )
+            yield family
+
+    def save(self) -> bool:
+        if not self.path or not self._dirty:
+            return False
+        self._dirty = False
+        data = {
+            "version": FORMAT_VERSION,
+            "counters": [
+                [server, name, state, count]
+                for (server, name, state), count in list(self.counts.items())
+            ],
+        }
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file_handle:
+                json.dump(data, file_handle)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as exc:
+            logger.error(f"Cannot save job counters to {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            self._dirty = True
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def load(self, server_names: List[str]) -> bool:
+        """
+        Add counts saved by a previous run, counts of servers not configured anymore are dropped
+        """
+        if not self.path:
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_handle:
+                data = json.load(file_handle)
+            if data.get("version") != FORMAT_VERSION:
+                logger.error(f"Bogus job counters file {self.path}")
+                return False
+            counters = [
+                (str(server), str(name), str(state), int(count))
+                for server, name, state, count in data["counters"]
+            ]
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as exc:
+            logger.error(f"Cannot load job counters from {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            return False
+        for server, name, state, count in counters:
+            if server not in server_names:
+                continue
+            key = (server, name, state)
+            self.counts[key] = self.counts.get(key, 0) + count
+        return True
@@ -12,134 +12,372 @@ __license__ = "GPL-3.0-only"
 __build__ = "2024091001"
 
 
-import sys
+from typing import Sequence, Union
+import os
+from pathlib import Path
 from logging import getLogger
 import secrets
-from argparse import ArgumentParser
-from fastapi import FastAPI, HTTPException, Depends, status
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.responses import Response
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi_offline import FastAPIOffline
 from altaro_exporter.__version__ import __version__
-from altaro_exporter.configuration import load_config
-from altaro_exporter.altaro_api import AltaroAPI
-import prometheus_client
+from altaro_exporter.altaro_api import AsyncAltaroAPI
+from altaro_exporter.poller import Poller, AltaroServer, VMSource
+from altaro_exporter.sources import read_source_options
+from altaro_exporter.shared_state import LeaderLock, SharedSnapshot
+from altaro_exporter.vm_store import VMStore
+from altaro_exporter.scheduler import AdaptiveSchedule
+from altaro_exporter.cardinality import SeriesRules, VMFilter
+from altaro_exporter.policies import BackupPolicies
+from altaro_exporter.job_counters import JobCounters
+from altaro_exporter.probe import SessionPool, probe_target
+from altaro_exporter.session import SessionManager, SessionStore
+from altaro_exporter.inventory import VMInventory
+from altaro_exporter.circuit_breaker import CircuitBreaker
+from altaro_exporter.timestamps import set_altaro_timezone
+from altaro_exporter.instrumentation import create_registry
+from altaro_exporter.exposition import (
+    select_encoding,
+    body_chunks,
+    render_snapshot_age,
+)
 
 
 logger = getLogger()
 
 
-# Make sure we load given config files again
-default_config_file = "altaro_exporter.yaml"
-parser = ArgumentParser()
-parser.add_argument(
-    "-c",
-    "--config-file",
-    dest="config_file",
-    type=str,
-    default=default_config_file,
-    required=False,
-    help="Path to altaro_exporter.yaml file",
-)
-args = parser.parse_args()
-if args.config_file:
-    config_dict = load_config(args.config_file)
-else:
-    logger.critical("No configuration file given. Exiting.")
-    sys.exit(1)
-
-if not config_dict:
-    logger.critical("No configuration file loaded. Exiting.")
-    sys.exit(1)
-
-altaro_rest_host = config_dict.g("altaro_server.rest_host")
-altaro_rest_port = config_dict.g("altaro_server.rest_port")
-altaro_rest_path = config_dict.g("altaro_server.rest_path")
-altaro_server_address = config_dict.g("altaro_server.server_address")
-altaro_server_port = config_dict.g("altaro_server.server_port")
-username = config_dict.g("altaro_server.username")
-password = config_dict.g("altaro_server.password")
-domain = config_dict.g("altaro_server.domain")
-
-try:
-    include_unconfigured = config_dict["options"]["include_unconfigured"]
-except:
-    include_unconfigured = True
-try:
-    include_non_scheduled = config_dict["options"]["include_non_scheduled"]
-except:
-    include_non_scheduled = True
-
-
-app = FastAPIOffline()
-metrics_app = prometheus_client.make_asgi_app()
-app.mount("/metrics", metrics_app)
 security = HTTPBasic()
 
-api = AltaroAPI(
-    altaro_rest_host=altaro_rest_host,
-    altaro_rest_port=altaro_rest_port,
-    altaro_rest_path=altaro_rest_path,
-    altaro_server_address=altaro_server_address,
-    altaro_server_port=altaro_server_port,
-    username=username,
-    password=password,
-    domain=domain,
-    cert_verify=False,
-)
-api.authenticate()
+
+class ChunkedResponse(Response):
+    """
+    Response whose body is sent as a sequence of chunks with a known total length
+    Lets /metrics hand the cached exposition to the server as is, instead of copying it to append the per scrape tail
+    """
+
+    def __init__(
+        self, chunks: Sequence[Union[bytes, memoryview]], headers: dict, media_type: str
+    ):
+        self.chunks = chunks
+        headers = dict(headers)
+        headers["Content-Length"] = str(sum(len(chunk) for chunk in chunks))
+        super().__init__(headers=headers, media_type=media_type)
+
+    async def __call__(self, scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        last = len(self.chunks) - 1
+        for index, chunk in enumerate(self.chunks):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": index < last,
+                }
+            )
 
 
 def anonymous_auth():
     return "anonymous"
 
 
-def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
-    current_username_bytes = credentials.username.encode("utf8")
-    correct_username_bytes = config_dict["http_server"]["username"].encode("utf-8")
-    is_correct_username = secrets.compare_digest(
-        current_username_bytes, correct_username_bytes
+def _get_auth_scheme(config_dict: dict):
+    def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
+        current_username_bytes = credentials.username.encode("utf8")
+        correct_username_bytes = config_dict["http_server"]["username"].encode("utf-8")
+        is_correct_username = secrets.compare_digest(
+            current_username_bytes, correct_username_bytes
+        )
+        current_password_bytes = credentials.password.encode("utf8")
+        correct_password_bytes = config_dict["http_server"]["password"].encode("utf-8")
+        is_correct_password = secrets.compare_digest(
+            current_password_bytes, correct_password_bytes
+        )
+        if not (is_correct_username and is_correct_password):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect email or password",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+        return credentials.username
+
+    try:
+        if config_dict["http_server"]["no_auth"] is True:
+            logger.warning("Running without HTTP authentication")
+            return anonymous_auth
+    except (KeyError, AttributeError, TypeError):
+        pass
+    logger.info("Running with HTTP authentication")
+    return get_current_username
+
+
+def create_app(config_dict: dict, config_file: Path) -> FastAPI:
+    """
+    Build the exporter app from a loaded configuration
+    No network I/O happens here: Altaro sessions are opened by the poller once the app is started
+    config_file is only used to locate state files
+    """
+    try:
+        include_unconfigured = config_dict["options"]["include_unconfigured"]
+    except:
+        include_unconfigured = True
+    try:
+        include_non_scheduled = config_dict["options"]["include_non_scheduled"]
+    except:
+        include_non_scheduled = True
+    try:
+        refresh_interval = int(config_dict["options"]["refresh_interval"])
+    except:
+        refresh_interval = 60
+    try:
+        state_dir = Path(config_dict["options"]["state_dir"])
+    except:
+        state_dir = None
+    if not state_dir:
+        # Config file directory is writable since we update the file with encrypted credentials
+        state_dir = Path(os.path.abspath(config_file)).parent
+    state_file_prefix = Path(config_file).stem
+
+    try:
+        session_max_age = int(config_dict["options"]["session_max_age"])
+    except:
+        session_max_age = 1200
+    set_altaro_timezone(config_dict.g("options.altaro_timezone"))
+    try:
+        vm_retire_grace_period = int(config_dict["options"]["vm_retire_grace_period"])
+    except:
+        vm_retire_grace_period = 0
+    try:
+        max_concurrent_polls = int(config_dict["options"]["max_concurrent_polls"])
+    except:
+        max_concurrent_polls = 4
+    try:
+        poll_timeout = int(config_dict["options"]["poll_timeout"])
+    except:
+        poll_timeout = 60
+    try:
+        max_staleness = int(config_dict["options"]["max_staleness"])
+    except:
+        max_staleness = 600
+    try:
+        stream_parse = bool(config_dict["options"]["stream_parse"])
+    except:
+        stream_parse = False
+    try:
+        warm_start = bool(config_dict["options"]["warm_start"])
+    except:
+        warm_start = True
+
+    # Regexes are compiled once here, bogus ones raise ValueError
+    vm_filter = VMFilter(
+        include_vmname=config_dict.g("options.vm_filter.include_vmname"),
+        exclude_vmname=config_dict.g("options.vm_filter.exclude_vmname"),
+        include_hostname=config_dict.g("options.vm_filter.include_hostname"),
+        exclude_hostname=config_dict.g("options.vm_filter.exclude_hostname"),
     )
-    current_password_bytes = credentials.password.encode("utf8")
-    correct_password_bytes = config_dict["http_server"]["password"].encode("utf-8")
-    is_correct_password = secrets.compare_digest(
-        current_password_bytes, correct_password_bytes
+    if vm_filter.empty:
+        vm_filter = None
+    series_rules = SeriesRules(
+        labels=dict(config_dict.g("options.labels", default=None) or {}),
+        disabled_metrics=config_dict.g("options.disabled_metrics", default=None) or (),
     )
-    if not (is_correct_username and is_correct_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Basic"},
+    # Policies are opt-in, they add up to four series per VM
+    policies_config = config_dict.g("options.backup_policies", default=None)
+    policies = BackupPolicies(policies_config) if policies_config else None
+
+    if config_dict.g("options.adaptive_refresh.enabled", default=False):
+        schedule = AdaptiveSchedule(
+            min_interval=config_dict.g(
+                "options.adaptive_refresh.min_interval", default=15
+            ),
+            max_interval=config_dict.g(
+                "options.adaptive_refresh.max_interval", default=900
+            ),
+            completion_window=config_dict.g(
+                "options.adaptive_refresh.completion_window", default=900
+            ),
         )
-    return credentials.username
+    else:
+        schedule = None
 
+    session_store = SessionStore(state_dir / f"{state_file_prefix}.sessions")
+    job_counters = JobCounters(state_dir / f"{state_file_prefix}.counters")
 
-try:
-    if config_dict["http_server"]["no_auth"] is True:
-        logger.warning("Running without HTTP authentication")
-        auth_scheme = anonymous_auth
-    else:
-        logger.info("Running with HTTP authentication")
-        auth_scheme = get_current_username
-except (KeyError, AttributeError, TypeError):
-    auth_scheme = get_current_username
-    logger.info("Running with HTTP authentication")
+    def _create_altaro_server(server_config: dict) -> AltaroServer:
+        altaro_rest_host = server_config.g("rest_host")
+        name = server_config.g("name", default=altaro_rest_host)
+        api = AsyncAltaroAPI(
+            altaro_rest_host=altaro_rest_host,
+            altaro_rest_scheme=server_config.g("rest_scheme", default="https"),
+            altaro_rest_port=server_config.g("rest_port"),
+            altaro_rest_path=server_config.g("rest_path"),
+            altaro_server_address=server_config.g("server_address"),
+            altaro_server_port=server_config.g("server_port"),
+            username=server_config.g("username"),
+            password=server_config.g("password"),
+            domain=server_config.g("domain"),
+            cert_verify=server_config.g("cert_verify", default=False),
+            connect_timeout=server_config.g("connect_timeout", default=5),
+            read_timeout=server_config.g("read_timeout", default=30),
+            stream_parse=stream_parse,
+            name=name,
+        )
+        session = SessionManager(
+            api, name=name, store=session_store, max_age=session_max_age
+        )
+        inventory = VMInventory(
+            name, retire_grace_period=vm_retire_grace_period, counters=job_counters
+        )
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=config_dict.g(
+                "options.circuit_breaker.failure_threshold", default=3
+            ),
+            base_backoff=config_dict.g(
+                "options.circuit_breaker.base_backoff", default=30
+            ),
+            max_backoff=config_dict.g(
+                "options.circuit_breaker.max_backoff", default=900
+            ),
+        )
+        return AltaroServer(
+            name=name, api=api, session=session, inventory=inventory, breaker=breaker
+        )
 
+    # Config may either have a single altaro_server section or a list of altaro_servers
+    altaro_server_configs = config_dict.g("altaro_servers")
+    if not altaro_server_configs:
+        altaro_server_configs = [config_dict.g("altaro_server")]
+    altaro_servers = [
+        _create_altaro_server(server_config)
+        for server_config in altaro_server_configs
+        if server_config
+    ]
+    if not altaro_servers:
+        raise ValueError("No altaro_server configured")
 
-@app.get("/")
-async def api_root(auth=Depends(auth_scheme)):
-    return {"app": __appname__, "version": __version__}
+    source_options = read_source_options(
+        config_dict, {"vms": {"interval": refresh_interval, "timeout": poll_timeout}}
+    )
+    sources = [
+        VMSource(
+            refresh_interval=source_options["vms"]["interval"],
+            poll_timeout=source_options["vms"]["timeout"],
+            max_staleness=max_staleness,
+            include_unconfigured=include_unconfigured,
+            include_non_scheduled=include_non_scheduled,
+            vm_store=(
+                VMStore(state_dir / f"{state_file_prefix}.vms") if warm_start else None
+            ),
+            schedule=schedule,
+            vm_filter=vm_filter,
+            series_rules=series_rules,
+            policies=policies,
+            counters=job_counters,
+        )
+    ]
 
+    poller = Poller(
+        altaro_servers,
+        sources,
+        max_concurrent_polls=max_concurrent_polls,
+        # Not the global registry, so several apps can be built in one process
+        registry=create_registry(series_rules),
+        leader_lock=LeaderLock(state_dir / f"{state_file_prefix}.lock"),
+        shared=SharedSnapshot(state_dir / f"{state_file_prefix}.snapshot"),
+        max_staleness=max_staleness,
+    )
 
-@app.get("/metrics")
-async def get_metrics(auth=Depends(auth_scheme)):
-    try:
-        api.list_vms(
+    session_pool = SessionPool(
+        profiles=config_dict.g("probe.profiles"),
+        max_sessions=config_dict.g("probe.max_sessions", default=32),
+        idle_timeout=config_dict.g("probe.session_idle_timeout", default=600),
+    )
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Poller task needs to be started in every worker event loop, only the lock holder polls
+        # Authentication happens on first poll, in background
+        poller.start()
+        session_pool.start()
+        yield
+        await poller.stop()
+        await session_pool.stop()
+
+    app = FastAPIOffline(lifespan=lifespan)
+    app.state.poller = poller
+    app.state.session_pool = session_pool
+    auth_scheme = _get_auth_scheme(config_dict)
+
+    @app.get("/")
+    async def api_root(auth=Depends(auth_scheme)):
+        return {"app": __appname__, "version": __version__}
+
+    @app.get("/metrics")
+    async def get_metrics(request: Request, auth=Depends(auth_scheme)):
+        snapshot = poller.get_snapshot()
+        if snapshot is None and poller.is_leader:
+            # First poll is still running, join it instead of failing the scrape
+            snapshot = await poller.refresh()
+        if snapshot is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="No metrics collected yet",
+            )
+        # Serve what we have right away, a stale snapshot gets refreshed in background
+        poller.revalidate()
+        exposition = snapshot.exposition
+        # No ETag / 304, a cached body would keep an outdated altaro_snapshot_age_seconds tail
+        headers = {"Vary": "Accept-Encoding"}
+        encoding, content = select_encoding(
+            exposition, request.headers.get("accept-encoding")
+        )
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        chunks = body_chunks(
+            exposition,
+            encoding,
+            content,
+            render_snapshot_age(snapshot.server_timestamps, time.time()),
+        )
+        return ChunkedResponse(chunks, headers=headers, media_type="text/plain")
+
+    @app.get("/probe")
+    async def probe(target: str, profile: str = "default", auth=Depends(auth_scheme)):
+        try:
+            allowed = session_pool.target_allowed(target, profile)
+        except KeyError:
+            allowed = None
+        if allowed is False:
+            # Profile credentials are only ever sent to allowed targets
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Target {target} is not allowed by probe profile {profile}",
+            )
+        content = await probe_target(
+            session_pool,
+            target,
+            profile,
+            timeout=poll_timeout,
             include_unconfigured=include_unconfigured,
             include_non_scheduled=include_non_scheduled,
+            vm_filter=vm_filter,
+            series_rules=series_rules,
+            policies=policies,
         )
-        content = prometheus_client.generate_latest()
-        api.reset_vm_metrics()
-    except KeyError:
-        logger.critical("Bogus configuration file. Missing Altaro_hosts key.")
-    return Response(content=content, media_type="text/plain")
+        if content is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown probe profile {profile}",
+            )
+        return Response(content=content, media_type="text/plain")
+
+    return app
@@ -0,0 +1,274 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.policies"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from logging import getLogger
+from prometheus_client.core import GaugeMetricFamily
+from altaro_exporter.records import VMRecord
+from altaro_exporter.cardinality import _compile
+
+
+logger = getLogger()
+
+
+# Job name in metric names, VMRecord attributes and BackupPolicy max ages, description
+POLICY_JOBS = (("backup", "backup"), ("offsitecopy", "offsite copy"))
+
+
+class BackupPolicy:
+    """
+    Thresholds a group of VMs is checked against
+    A VM matches when its name and host name match the policy regexes, a policy without regexes matches every VM
+    """
+
+    __slots__ = (
+        "name",
+        "vmname",
+        "hostname",
+        "backup_max_age",
+        "offsitecopy_max_age",
+        "late_after",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        vmname=None,
+        hostname=None,
+        backup_max_age: Optional[float] = None,
+        offsitecopy_max_age: Optional[float] = None,
+        late_after: Optional[float] = None,
+    ):
+        if not name:
+            raise ValueError("Backup policies need a name")
+        self.name = str(name)
+        self.vmname = _compile(vmname, f"backup policy {name} vmname")
+        self.hostname = _compile(hostname, f"backup policy {name} hostname")
+        try:
+            self.backup_max_age = _seconds(backup_max_age)
+            self.offsitecopy_max_age = _seconds(offsitecopy_max_age)
+            self.late_after = _seconds(late_after)
+        except (TypeError, ValueError):
+            raise ValueError(f"Bogus duration in backup policy {name}")
+
+    def matches(self, vmname: Optional[str], hostname: Optional[str]) -> bool:
+        if self.vmname and not self.vmname.fullmatch(vmname or ""):
+            return False
+        if self.hostname and not self.hostname.fullmatch(hostname or ""):
+            return False
+        return True
+
+    def job_status(
+        self,
+        max_age: Optional[float],
+        last_success: Optional[float],
+        last_time: Optional[float],
+        next_time: Optional[float],
+        now: float,
+    ) -> Tuple[Optional[float], bool]:
+        """
+        Seconds since last successful job (None if none was ever seen), and whether the job is overdue
+
+        A job is overdue when its last success is older than max_age, when it was run but never succeeded,
+        or when its next scheduled run is late by more than late_after seconds
+        """
+        age = None if last_success is None else max(int(now - last_success), 0)
+        if age is None:
+            overdue = last_time is not None
+        else:
+            overdue = age > max_age
+        if (
+            not overdue
+            and self.late_after is not None
+            and next_time is not None
+            and now - next_time > self.late_after
+        ):
+            overdue = True
+        return age, overdue
+
+
+def _seconds(value) -> Optional[float]:
+    if value is None:
+        return None
+    return float(value)
+
+
+class BackupPolicies:
+    """
+    Ordered backup policies from options.backup_policies, the first one matching a VM applies
+    VMs matching no policy aren't checked
+    """
+
+    # Bound to the policy match cache, it's reset once reached
+    MAX_CACHED_MATCHES = 1 << 17
+
+    def __init__(self, policies: Iterable[dict]):
+        self.policies: List[BackupPolicy] = []
+        for policy in policies:
+            try:
+                self.policies.append(BackupPolicy(**dict(policy)))
+            except TypeError as exc:
+                raise ValueError(f"Bogus backup policy {policy}: {exc}")
+        names = [policy.name for policy in self.policies]
+        if len(set(names)) != len(names):
+            raise ValueError("Backup policy names must be unique")
+        # (vmname, hostname): matching BackupPolicy or None, names are matched once instead of every render
+        self._matches: Dict[Tuple[str, str], Optional[BackupPolicy]] = {}
+
+    def policy(self, vm: VMRecord) -> Optional[BackupPolicy]:
+        key = (vm.vmname, vm.hostname)
+        try:
+            return self._matches[key]
+        except KeyError:
+            pass
+        if len(self._matches) >= self.MAX_CACHED_MATCHES:
+            self._matches = {}
+        match = None
+        for policy in self.policies:
+            if policy.matches(vm.vmname, vm.hostname):
+                match = policy
+                break
+        self._matches[key] = match
+        return match
+
+
+class PolicyGroup:
+    """
+    Totals of the VMs of one server checked against one policy
+    """
+
+    __slots__ = ("vms", "overdue", "max_age")
+
+    def __init__(self):
+        self.vms = 0
+        # Job name: number of overdue VMs
+        self.overdue = {job: 0 for job, _ in POLICY_JOBS}
+        # Job name: age of the oldest last successful job
+        self.max_age = {job: None for job, _ in POLICY_JOBS}
+
+
+class PolicyReport:
+    """
+    Per VM and per policy group overdue flags and seconds since last successful jobs
+    Filled VM by VM while the collector walks VMs, ages being computed against the render time
+    """
+
+    def __init__(
+        self,
+        policies: BackupPolicies,
+        vm_labels: List[str],
+        now: float,
+        enabled: Callable[[str], bool] = lambda name: True,
+    ):
+        self.policies = policies
+        self.now = now
+        self._families = self._vm_families(vm_labels)
+        # Families of disabled metrics aren't filled
+        self._vm_families_enabled = {
+            key: family
+            for key, family in self._families.items()
+            if enabled(family.name)
+        }
+        # (server, policy name): PolicyGroup
+        self.groups: Dict[Tuple[str, str], PolicyGroup] = {}
+
+    @staticmethod
+    def _vm_families(vm_labels: List[str]) -> Dict[str, GaugeMetricFamily]:
+        families = {}
+        for job, job_name in POLICY_JOBS:
+            families[f"{job}_age"] = GaugeMetricFamily(
+                f"altaro_lastsuccessful{job}_age_seconds",
+                f"Seconds since last successful {job_name}, warnings included",
+                labels=vm_labels,
+            )
+            families[f"{job}_overdue"] = GaugeMetricFamily(
+                f"altaro_{job}_overdue",
+                f"Whether {job_name} of the VM is overdue according to its backup policy 0 = no, 1 = yes",
+                labels=vm_labels + ["policy"],
+            )
+        return families
+
+    @staticmethod
+    def _group_families() -> Dict[str, GaugeMetricFamily]:
+        labels = ["server", "policy"]
+        families = {
+            "vms": GaugeMetricFamily(
+                "altaro_policy_vms",
+                "Number of VMs checked against a backup policy",
+                labels=labels,
+            )
+        }
+        for job, job_name in POLICY_JOBS:
+            families[f"{job}_overdue"] = GaugeMetricFamily(
+                f"altaro_policy_{job}_overdue_vms",
+                f"Number of VMs whose {job_name} is overdue according to a backup policy",
+                labels=labels,
+            )
+            families[f"{job}_max_age"] = GaugeMetricFamily(
+                f"altaro_policy_lastsuccessful{job}_max_age_seconds",
+                f"Seconds since the oldest last successful {job_name} of VMs of a backup policy",
+                labels=labels,
+            )
+        return families
+
+    def add(self, server: str, labels: List[Optional[str]], vm: VMRecord):
+        policy = self.policies.policy(vm)
+        if policy is None:
+            return
+        key = (server, policy.name)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = PolicyGroup()
+        group.vms += 1
+        families = self._vm_families_enabled
+        for job, _ in POLICY_JOBS:
+            max_age = getattr(policy, f"{job}_max_age")
+            if max_age is None:
+                continue
+            last_time = getattr(vm, f"last{job}_timestamp")
+            next_time = getattr(vm, f"next{job}_timestamp")
+            last_success = getattr(vm, f"lastsuccessful{job}_timestamp")
+            if last_time is None and next_time is None and last_success is None:
+                # Job isn't configured for this VM
+                continue
+            age, overdue = policy.job_status(
+                max_age, last_success, last_time, next_time, self.now
+            )
+            if age is not None:
+                family = families.get(f"{job}_age")
+                if family is not None:
+                    family.add_metric(labels, age)
+                if group.max_age[job] is None or age > group.max_age[job]:
+                    group.max_age[job] = age
+            family = families.get(f"{job}_overdue")
+            if family is not None:
+                family.add_metric(labels + [policy.name], int(overdue))
+            if overdue:
+                group.overdue[job] += 1
+
+    def describe(self) -> Iterator[GaugeMetricFamily]:
+        yield from self._families.values()
+        yield from self._group_families().values()
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        yield from self._vm_families_enabled.values()
+        families = self._group_families()
+        for (server, name), group in self.groups.items():
+            labels = [server, name]
+            families["vms"].add_metric(labels, group.vms)
+            for job, _ in POLICY_JOBS:
+                families[f"{job}_overdue"].add_metric(labels, group.overdue[job])
+                if group.max_age[job] is not None:
+                    families[f"{job}_max_age"].add_metric(labels, group.max_age[job])
+        yield from families.values()
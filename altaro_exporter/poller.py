@@ -0,0 +1,627 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.poller"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from logging import getLogger
+from itertools import chain
+import asyncio
+import time
+from altaro_exporter.altaro_api import AsyncAltaroAPI, parse_vm
+from altaro_exporter.collector import AltaroCollector, ServerSnapshot
+from altaro_exporter.exposition import Exposition, render_exposition
+from altaro_exporter.session import SessionManager
+from altaro_exporter.inventory import VMInventory
+from altaro_exporter.circuit_breaker import CircuitBreaker, CLOSED
+from altaro_exporter.singleflight import SingleFlight
+from altaro_exporter.instrumentation import (
+    API_FAILURES,
+    REFRESH_PHASE_DURATION,
+    create_registry,
+)
+from altaro_exporter.vm_store import VMStore
+from altaro_exporter.scheduler import AdaptiveSchedule, REFRESH_INTERVAL
+from altaro_exporter.sources import DataSource
+from altaro_exporter.cardinality import SeriesRules, VMFilter
+from altaro_exporter.policies import BackupPolicies
+from altaro_exporter.job_counters import JobCounters
+from altaro_exporter.timestamps import clear_altaro_time_cache
+
+
+logger = getLogger()
+
+
+class Snapshot(NamedTuple):
+    """
+    Immutable result of a refresh, swapped as a whole by the poller
+    """
+
+    exposition: Exposition
+    timestamp: float
+    success: bool
+    # (server name, timestamp of its last successful poll or None), served as altaro_snapshot_age_seconds
+    server_timestamps: Tuple[Tuple[str, Optional[float]], ...] = ()
+
+
+class AltaroServer(NamedTuple):
+    """
+    An Altaro server polled by the exporter, name is used as server label
+    """
+
+    name: str
+    api: AsyncAltaroAPI
+    session: Optional[SessionManager] = None
+    inventory: Optional[VMInventory] = None
+    breaker: Optional[CircuitBreaker] = None
+
+
+async def poll_server(
+    server: AltaroServer,
+    timeout: int = 60,
+    include_unconfigured: bool = True,
+    include_non_scheduled: bool = True,
+    vm_filter: Optional[VMFilter] = None,
+) -> ServerSnapshot:
+    """
+    List VMs of one Altaro server, giving up after timeout seconds
+    With an inventory, VMs are merged one by one as the API hands them over
+    With a circuit breaker, fails fast without calling the API while the breaker is open
+    """
+    if server.breaker and not server.breaker.allow():
+        logger.info(f"Circuit breaker of {server.name} is open, skipping poll")
+        API_FAILURES.labels(server.name, "circuit_open").inc()
+        return ServerSnapshot(
+            name=server.name,
+            api_success=server.api.api_success or 1,
+            vms=(),
+            success=False,
+        )
+    if server.inventory:
+        server.inventory.begin()
+    # Every way out of a poll, exceptions and cancellation included, is reported to the breaker
+    # A half open breaker would otherwise never let another poll through
+    success = False
+    records = ()
+    fetch_seconds = parse_seconds = 0.0
+    try:
+        start = time.perf_counter()
+        try:
+            vms = await asyncio.wait_for(
+                server.api.list_vms(
+                    include_unconfigured=include_unconfigured,
+                    include_non_scheduled=include_non_scheduled,
+                    on_vm=server.inventory.add if server.inventory else None,
+                    vm_filter=vm_filter,
+                ),
+                timeout=timeout,
+            )
+            api_success = server.api.api_success
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Altaro server {server.name} did not answer within {timeout}s"
+            )
+            API_FAILURES.labels(server.name, "poll_timeout").inc()
+            vms = False
+            api_success = 1
+        fetch_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        if vms is False:
+            pass
+        elif server.inventory:
+            records = server.inventory.finish()
+        else:
+            records = tuple(parse_vm(vm) for vm in vms)
+        parse_seconds = time.perf_counter() - start
+        success = vms is not False
+    except Exception as exc:
+        # A bogus VM object or an unexpected client error only fails this server
+        logger.error(f"Polling Altaro server {server.name} failed: {exc}")
+        logger.debug("Trace:", exc_info=True)
+        API_FAILURES.labels(server.name, "unexpected").inc()
+        records = ()
+        api_success = 2
+    finally:
+        if server.breaker:
+            if success:
+                server.breaker.record_success()
+            else:
+                server.breaker.record_failure()
+        clear_altaro_time_cache()
+    if server.inventory:
+        # VMs were merged while fetching
+        fetch_seconds -= server.inventory.parse_seconds
+        parse_seconds += server.inventory.parse_seconds
+    REFRESH_PHASE_DURATION.labels("fetch").observe(max(fetch_seconds, 0))
+    REFRESH_PHASE_DURATION.labels("parse").observe(parse_seconds)
+    return ServerSnapshot(
+        name=server.name,
+        api_success=api_success,
+        vms=records,
+        success=success,
+    )
+
+
+class VMSource(DataSource):
+    """
+    VM backup data from vms/list, exported by AltaroCollector
+
+    When a server poll fails, its last good data keeps being served for up to max_staleness seconds
+
+    When a VM store is given, last good data is saved after every refresh and loaded back on start,
+    so a restarted exporter serves it right away with its true age instead of leaving a gap
+
+    When an adaptive schedule is given, the interval between refreshes follows Altaro job schedules
+    instead of refresh_interval, which then only caps it while a server poll fails
+
+    When job counters are given, they're exported along VM data, saved and loaded with it
+    """
+
+    name = "vms"
+
+    def __init__(
+        self,
+        refresh_interval: float = 60,
+        poll_timeout: float = 60,
+        max_staleness: int = 600,
+        include_unconfigured: bool = True,
+        include_non_scheduled: bool = True,
+        vm_store: Optional[VMStore] = None,
+        schedule: Optional[AdaptiveSchedule] = None,
+        vm_filter: Optional[VMFilter] = None,
+        series_rules: Optional[SeriesRules] = None,
+        policies: Optional[BackupPolicies] = None,
+        counters: Optional[JobCounters] = None,
+    ):
+        super().__init__(interval=refresh_interval, timeout=poll_timeout)
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.include_unconfigured = include_unconfigured
+        self.include_non_scheduled = include_non_scheduled
+        self.vm_store = vm_store
+        self.schedule = schedule
+        self.vm_filter = vm_filter
+        self.collector = AltaroCollector(series_rules, policies)
+        self.counters = counters
+        # server name: last successful ServerSnapshot
+        self._last_good = {}
+        self._save_pending = False
+
+    def failed(self, server: AltaroServer) -> ServerSnapshot:
+        return ServerSnapshot(name=server.name, api_success=2, vms=(), success=False)
+
+    async def poll(self, server: AltaroServer) -> ServerSnapshot:
+        return await poll_server(
+            server,
+            timeout=self.timeout,
+            include_unconfigured=self.include_unconfigured,
+            include_non_scheduled=self.include_non_scheduled,
+            vm_filter=self.vm_filter,
+        )
+
+    def _serve_stale(self, server: ServerSnapshot, now: float) -> ServerSnapshot:
+        """
+        Swap in last good VM data of a failed server, unless it is older than max_staleness
+        """
+        if server.success:
+            self.last_success[server.name] = now
+            self._last_good[server.name] = server
+            return server
+        last_good = self._last_good.get(server.name)
+        if last_good is None:
+            return server
+        age = now - self.last_success[server.name]
+        if age > self.max_staleness:
+            logger.warning(
+                f"Dropping data of Altaro server {server.name}, last successful poll was {age:.0f}s ago"
+            )
+            del self._last_good[server.name]
+            return server
+        logger.info(
+            f"Serving {age:.0f}s old data of Altaro server {server.name} since polling failed"
+        )
+        return server._replace(vms=last_good.vms)
+
+    def update(self, results: Iterable[ServerSnapshot], now: float) -> bool:
+        start = time.perf_counter()
+        results = list(results)
+        success = all(server.success for server in results)
+        servers = [self._serve_stale(server, now) for server in results]
+        self.collector.update(servers)
+        if self.schedule:
+            self.interval = self.schedule.next_interval(
+                chain.from_iterable(server.vms for server in servers), now
+            )
+            if not success:
+                # Don't wait for the next backup job to find out whether a failed server is back
+                self.interval = min(self.interval, self.refresh_interval)
+            logger.debug(f"Next refresh of VMs in {self.interval:.0f}s")
+        REFRESH_INTERVAL.set(self.interval)
+        REFRESH_PHASE_DURATION.labels("build").observe(time.perf_counter() - start)
+        self._save_pending = any(server.success for server in results)
+        return success
+
+    def save(self):
+        if not self._save_pending:
+            return
+        self._save_pending = False
+        if self.counters:
+            self.counters.save()
+        if not self.vm_store:
+            return
+        self.vm_store.save(
+            [
+                (name, self.last_success[name], server.vms)
+                for name, server in list(self._last_good.items())
+            ]
+        )
+
+    def load(self, servers: List[AltaroServer]) -> bool:
+        """
+        Serve VM data saved by a previous run until the first refresh completes
+        Data older than max_staleness is ignored, as it would be dropped on the first failed poll anyway
+        Saved records still seed server inventories, so last successful job times survive restarts
+        and jobs completed meanwhile get counted on first poll
+        """
+        if self.counters:
+            self.counters.load([server.name for server in servers])
+        if not self.vm_store:
+            return False
+        servers = {server.name: server for server in servers}
+        now = time.time()
+        for name, timestamp, records in self.vm_store.load():
+            server = servers.get(name)
+            if server is None:
+                continue
+            if server.inventory:
+                server.inventory.restore(records, timestamp)
+            if now - timestamp > self.max_staleness:
+                continue
+            self.last_success[name] = timestamp
+            self._last_good[name] = ServerSnapshot(
+                name=name, api_success=None, vms=records, success=False
+            )
+        if not self._last_good:
+            return False
+        logger.info(
+            f"Serving saved data of {len(self._last_good)} Altaro server(s) until first refresh"
+        )
+        self.collector.update(list(self._last_good.values()))
+        return True
+
+    def _enabled_counters(self, families):
+        rules = self.collector.rules
+        for family in families:
+            if rules.family_enabled(family):
+                yield family
+
+    def describe(self):
+        yield from self.collector.describe()
+        if self.counters:
+            yield from self._enabled_counters(self.counters.describe())
+
+    def collect(self):
+        yield from self.collector.collect()
+        if self.counters:
+            yield from self._enabled_counters(self.counters.collect())
+
+
+class Poller:
+    """
+    Polls Altaro API in background so scrapes only serve the latest snapshot
+    Runs as an asyncio task in the event loop of the worker serving HTTP requests
+    Altaro servers are polled concurrently, a slow or dead server only costs its own timeout
+
+    Every data source is refreshed on its own interval in its own task, and metrics are rendered again
+    each time one of them completes, so a slow source never holds up the others
+
+    When a leader lock is given, only the worker holding it polls Altaro API and publishes
+    its snapshot to the shared snapshot file other workers serve from
+    A shared snapshot may be left over by an earlier run, so it's only served once this process
+    has published, or when it's younger than max_staleness
+    """
+
+    def __init__(
+        self,
+        servers: List[AltaroServer],
+        sources: List[DataSource],
+        max_concurrent_polls: int = 4,
+        registry=None,
+        leader_lock=None,
+        shared=None,
+        max_staleness: Optional[float] = None,
+    ):
+        self.servers = servers
+        self.sources = sources
+        self.max_concurrent_polls = max_concurrent_polls
+        self.snapshot: Optional[Snapshot] = None
+        # Each poller gets its own registry unless given one, so several can live in a process
+        self.registry = registry if registry is not None else create_registry()
+        for source in self.sources:
+            self.registry.register(source)
+        self.leader_lock = leader_lock
+        self.shared = shared
+        self.max_staleness = max_staleness
+
+        self._task = None
+        # Created lazily since they must belong to the running loop
+        self._semaphores = {}
+        self._publish_lock = None
+        self._sessions_resumed = False
+        self._single_flight = SingleFlight("metrics")
+        # source name: background refresh task
+        self._refreshes = {}
+        self._loaded = False
+        # Whether shared snapshots are known to come from this run
+        self._shared_trusted = False
+
+    @property
+    def is_leader(self) -> bool:
+        return self.leader_lock is None or self.leader_lock.held
+
+    @property
+    def interval(self) -> float:
+        """
+        Interval of the most frequently refreshed source
+        """
+        return min(source.interval for source in self.sources)
+
+    def get_snapshot(self) -> Optional[Snapshot]:
+        """
+        Latest snapshot, either our own or the one published by the leader worker
+        """
+        if self.is_leader and self.snapshot is not None:
+            return self.snapshot
+        if not self.shared:
+            return None
+        snapshot = self.shared.load()
+        if snapshot is None or self._shared_trusted:
+            return snapshot
+        if (
+            self.max_staleness is not None
+            and time.time() - snapshot.timestamp > self.max_staleness
+        ):
+            return None
+        # Snapshots published after this one are newer
+        self._shared_trusted = True
+        return snapshot
+
+    def _acquire_leadership(self) -> bool:
+        if not self.leader_lock.acquire():
+            return False
+        if self.shared:
+            self.shared.clear()
+        return True
+
+    def _refreshing(self, source: DataSource) -> bool:
+        task = self._refreshes.get(source.name)
+        return task is not None and not task.done()
+
+    def _start_refresh(self, source: DataSource):
+        if self._refreshing(source):
+            return
+        logger.debug(f"Refreshing {source.name} in background")
+        self._refreshes[source.name] = asyncio.get_running_loop().create_task(
+            self._refresh_in_background(source)
+        )
+
+    async def _refresh_in_background(self, source: DataSource):
+        try:
+            await self.refresh_source(source)
+        except Exception as exc:
+            logger.error(f"Refreshing Altaro {source.name} failed with: {exc}")
+            logger.debug("Trace:", exc_info=True)
+
+    def revalidate(self):
+        """
+        Start a background refresh of every source older than its interval, without waiting for it
+        Called by scrapes, which keep being served the current snapshot meanwhile
+        """
+        if not self.is_leader or self.snapshot is None:
+            return
+        now = time.time()
+        for source in self.sources:
+            if source.due_in(now) == 0:
+                self._start_refresh(source)
+
+    def _next_refresh_in(self) -> float:
+        if not self.is_leader or self.snapshot is None:
+            return self.interval
+        now = time.time()
+        # A source being refreshed is due again no sooner than its interval from now
+        return max(
+            min(
+                source.interval if self._refreshing(source) else source.due_in(now)
+                for source in self.sources
+            ),
+            1,
+        )
+
+    async def refresh(self) -> Snapshot:
+        """
+        Refresh all sources once, render metrics and swap in the new snapshot
+        Concurrent calls share the refreshes already in flight
+        """
+        await asyncio.gather(*(self.refresh_source(source) for source in self.sources))
+        return self.snapshot
+
+    async def refresh_source(self, source: DataSource) -> Snapshot:
+        """
+        Query all Altaro servers for one source, render metrics and swap in the new snapshot
+        Concurrent calls share the refresh already in flight
+        """
+        return await self._single_flight.do(source.name, self._refresh_source, source)
+
+    async def _poll(self, source: DataSource, server: AltaroServer):
+        async with self._semaphores[source.name]:
+            try:
+                return await source.poll(server)
+            except Exception as exc:
+                # Results of other servers must still make it to update()
+                logger.error(
+                    f"Polling {source.name} of Altaro server {server.name} failed: {exc}"
+                )
+                logger.debug("Trace:", exc_info=True)
+                return source.failed(server)
+
+    async def _refresh_source(self, source: DataSource) -> Snapshot:
+        if source.name not in self._semaphores:
+            self._semaphores[source.name] = asyncio.Semaphore(self.max_concurrent_polls)
+        results = await asyncio.gather(
+            *(self._poll(source, server) for server in self.servers)
+        )
+        now = time.time()
+        source.success = source.update(results, now)
+        source.timestamp = now
+        await self._publish()
+        await asyncio.get_running_loop().run_in_executor(None, source.save)
+        return self.snapshot
+
+    def _server_timestamps(self) -> Tuple[Tuple[str, Optional[float]], ...]:
+        """
+        Timestamp of the oldest data of every server, over all sources
+        """
+        server_timestamps = []
+        for server in self.servers:
+            timestamps = [
+                source.last_success[server.name]
+                for source in self.sources
+                if server.name in source.last_success
+            ]
+            server_timestamps.append(
+                (server.name, min(timestamps) if timestamps else None)
+            )
+        return tuple(server_timestamps)
+
+    async def _publish(self):
+        if self._publish_lock is None:
+            self._publish_lock = asyncio.Lock()
+        # Sources completing together render one after the other, so the last snapshot has all of them
+        async with self._publish_lock:
+            start = time.perf_counter()
+            # Rendering and compression are offloaded so large fleets don't stall the loop
+            exposition = await asyncio.get_running_loop().run_in_executor(
+                None, render_exposition, self.registry
+            )
+            REFRESH_PHASE_DURATION.labels("render").observe(time.perf_counter() - start)
+            # Attribute assignment is atomic, scrapes see either the old or the new snapshot
+            self.snapshot = Snapshot(
+                exposition=exposition,
+                timestamp=time.time(),
+                success=all(source.success for source in self.sources),
+                server_timestamps=self._server_timestamps(),
+            )
+            if self.shared:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.shared.publish, self.snapshot
+                )
+                self._shared_trusted = True
+
+    async def _load(self):
+        """
+        Serve data saved by a previous run until sources get refreshed
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        loaded = False
+        for source in self.sources:
+            if await asyncio.get_running_loop().run_in_executor(
+                None, source.load, self.servers
+            ):
+                loaded = True
+        if loaded:
+            await self._publish()
+
+    def _resume_sessions(self):
+        if self._sessions_resumed:
+            return
+        self._sessions_resumed = True
+        for server in self.servers:
+            if server.session:
+                server.session.resume()
+
+    async def _maintain_session(self, server: AltaroServer):
+        try:
+            await asyncio.wait_for(
+                server.session.maintain(next_use_in=self.interval),
+                timeout=max(source.timeout for source in self.sources),
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"Renewing Altaro session for {server.name} timed out")
+
+    async def maintain_sessions(self):
+        """
+        Renew sessions about to expire between two polls, so polls don't need to re-authenticate
+        """
+        await asyncio.gather(
+            *(
+                self._maintain_session(server)
+                for server in self.servers
+                # Don't log in to servers the circuit breaker keeps us away from
+                if server.session
+                and (server.breaker is None or server.breaker.state == CLOSED)
+            )
+        )
+
+    async def _run(self):
+        while True:
+            # Followers retry to get the lock so polling resumes if the leader dies
+            if self.is_leader or self._acquire_leadership():
+                try:
+                    self._resume_sessions()
+                    await self._load()
+                    # Sessions are renewed before polls start, never while they use them
+                    await self.maintain_sessions()
+                    now = time.time()
+                    for source in self.sources:
+                        if source.due_in(now) <= 1:
+                            self._start_refresh(source)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    logger.error(f"Refreshing Altaro metrics failed with: {exc}")
+                    logger.debug("Trace:", exc_info=True)
+            await asyncio.sleep(self._next_refresh_in())
+
+    def start(self):
+        """
+        Must be called from within the running event loop
+        """
+        if self._task and not self._task.done():
+            return
+        logger.info(
+            "Starting Altaro poller with "
+            + ", ".join(
+                f"{source.name} every {source.interval:.0f}s" for source in self.sources
+            )
+        )
+        if self.leader_lock:
+            # Before serving any scrape, so a snapshot left by an earlier run is never served
+            self._acquire_leadership()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        for task in self._refreshes.values():
+            task.cancel()
+        self._refreshes = {}
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for server in self.servers:
+            await server.api.close()
+        if self.leader_lock:
+            self.leader_lock.release()
@@ -0,0 +1,268 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.probe"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from logging import getLogger
+import asyncio
+import re
+import time
+import prometheus_client
+from prometheus_client import CollectorRegistry
+from altaro_exporter.altaro_api import AsyncAltaroAPI
+from altaro_exporter.collector import AltaroCollector
+from altaro_exporter.poller import AltaroServer, poll_server
+from altaro_exporter.singleflight import SingleFlight
+from altaro_exporter.cardinality import SeriesRules, VMFilter, _compile
+from altaro_exporter.policies import BackupPolicies
+
+
+logger = getLogger()
+
+
+_single_flight = SingleFlight("probe")
+
+# Host names, IPv4 and bracketed IPv6 addresses, nothing that could change the URL
+VALID_HOST = re.compile(r"[A-Za-z0-9._-]+|\[[0-9A-Fa-f:.]+\]")
+
+
+def split_target(target: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits host[:port] probe targets, port is None when not given
+    """
+    host, _, port = target.rpartition(":")
+    if not host or not port.isdigit():
+        return target, None
+    return host, port
+
+
+class PooledSession(NamedTuple):
+    api: AsyncAltaroAPI
+    last_used: float
+
+
+class SessionPool:
+    """
+    Bounded LRU pool of authenticated Altaro API sessions keyed by probe target and profile
+    Sessions are reused across probes, and logged out when evicted
+    Sessions handed out by get() are in use until release(), and never evicted meanwhile
+
+    Since profile credentials are sent to the probed target, every profile needs a targets allow-list
+    of regexes matching whole host names, raises ValueError otherwise
+    """
+
+    def __init__(self, profiles: dict, max_sessions: int = 32, idle_timeout: int = 600):
+        self.profiles = profiles or {}
+        self._allowed_targets = {}
+        for name, profile_config in self.profiles.items():
+            allowed = _compile(
+                profile_config.g("targets"), f"probe profile {name} targets"
+            )
+            if allowed is None:
+                raise ValueError(f"Probe profile {name} has no targets allow-list")
+            self._allowed_targets[name] = allowed
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        # key: number of probes using the session
+        self._in_use = {}
+        self._task = None
+
+    def target_allowed(self, target: str, profile: str) -> bool:
+        """
+        Whether target host matches the allow-list of profile, raises KeyError on unknown profiles
+        """
+        allowed = self._allowed_targets[profile]
+        host, _ = split_target(target)
+        return bool(VALID_HOST.fullmatch(host) and allowed.fullmatch(host))
+
+    def _create_api(self, target: str, profile: str) -> AsyncAltaroAPI:
+        """
+        target is host or host:port of the Altaro REST API, port defaults to the profile rest_port
+        Raises KeyError on unknown profiles, ValueError on targets the profile doesn't allow
+        """
+        if not self.target_allowed(target, profile):
+            raise ValueError(
+                f"Target {target} is not allowed by probe profile {profile}"
+            )
+        profile_config = self.profiles[profile]
+        host, port = split_target(target)
+        if port is None:
+            port = profile_config.g("rest_port")
+        return AsyncAltaroAPI(
+            altaro_rest_host=host,
+            altaro_rest_scheme=profile_config.g("rest_scheme", default="https"),
+            altaro_rest_port=int(port) if port else 36013,
+            altaro_rest_path=profile_config.g("rest_path", default="/api/rest"),
+            altaro_server_address=profile_config.g(
+                "server_address", default="LOCALHOST"
+            ),
+            altaro_server_port=profile_config.g("server_port", default=36014),
+            username=profile_config.g("username"),
+            password=profile_config.g("password"),
+            domain=profile_config.g("domain"),
+            cert_verify=profile_config.g("cert_verify", default=False),
+            connect_timeout=profile_config.g("connect_timeout", default=5),
+            read_timeout=profile_config.g("read_timeout", default=30),
+            name=target,
+        )
+
+    async def _close_session(self, key: tuple, api: AsyncAltaroAPI):
+        logger.info(f"Closing probe session for {key[0]} with profile {key[1]}")
+        try:
+            if api.session_id:
+                await api.authenticate(action="logout")
+        finally:
+            await api.close()
+
+    async def get(self, target: str, profile: str) -> AsyncAltaroAPI:
+        await self.evict_idle()
+        key = (target, profile)
+        session = self._sessions.pop(key, None)
+        if session:
+            api = session.api
+        else:
+            api = self._create_api(target, profile)
+        # Reinsertion keeps most recently used sessions at the end
+        self._sessions[key] = PooledSession(api=api, last_used=time.monotonic())
+        self._in_use[key] = self._in_use.get(key, 0) + 1
+        # Least recently used sessions go first, the pool may exceed max_sessions while all are in use
+        for old_key in [key for key in self._sessions if key not in self._in_use]:
+            if len(self._sessions) <= self.max_sessions:
+                break
+            old_session = self._sessions.pop(old_key, None)
+            if old_session:
+                await self._close_session(old_key, old_session.api)
+        return api
+
+    def release(self, target: str, profile: str):
+        """
+        Give back a session obtained with get()
+        """
+        key = (target, profile)
+        count = self._in_use.get(key, 0) - 1
+        if count > 0:
+            self._in_use[key] = count
+        else:
+            self._in_use.pop(key, None)
+        session = self._sessions.get(key)
+        if session:
+            self._sessions[key] = session._replace(last_used=time.monotonic())
+
+    async def evict_idle(self):
+        now = time.monotonic()
+        for key, session in list(self._sessions.items()):
+            if key in self._in_use or now - session.last_used <= self.idle_timeout:
+                continue
+            # Another eviction or probe may have taken or refreshed the session meanwhile
+            if self._sessions.get(key) is not session:
+                continue
+            del self._sessions[key]
+            await self._close_session(key, session.api)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 1))
+            try:
+                await self.evict_idle()
+            except Exception as exc:
+                logger.error(f"Evicting idle probe sessions failed with: {exc}")
+                logger.debug("Trace:", exc_info=True)
+
+    def start(self):
+        """
+        Must be called from within the running event loop
+        """
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._sessions:
+            key, session = self._sessions.popitem(last=False)
+            await self._close_session(key, session.api)
+
+
+async def probe_target(
+    session_pool: SessionPool,
+    target: str,
+    profile: str,
+    timeout: int = 60,
+    include_unconfigured: bool = True,
+    include_non_scheduled: bool = True,
+    vm_filter: Optional[VMFilter] = None,
+    series_rules: Optional[SeriesRules] = None,
+    policies: Optional[BackupPolicies] = None,
+) -> Optional[bytes]:
+    """
+    Returns rendered metrics for a single target, or None if profile is unknown or doesn't allow target
+    Concurrent probes of the same target and profile share one Altaro API call
+    """
+    return await _single_flight.do(
+        (target, profile),
+        _probe_target,
+        session_pool,
+        target,
+        profile,
+        timeout=timeout,
+        include_unconfigured=include_unconfigured,
+        include_non_scheduled=include_non_scheduled,
+        vm_filter=vm_filter,
+        series_rules=series_rules,
+        policies=policies,
+    )
+
+
+async def _probe_target(
+    session_pool: SessionPool,
+    target: str,
+    profile: str,
+    timeout: int = 60,
+    include_unconfigured: bool = True,
+    include_non_scheduled: bool = True,
+    vm_filter: Optional[VMFilter] = None,
+    series_rules: Optional[SeriesRules] = None,
+    policies: Optional[BackupPolicies] = None,
+) -> Optional[bytes]:
+    try:
+        api = await session_pool.get(target, profile)
+    except KeyError:
+        logger.error(f"Unknown probe profile {profile}")
+        return None
+    except ValueError as exc:
+        logger.error(str(exc))
+        return None
+    try:
+        server_snapshot = await poll_server(
+            AltaroServer(name=target, api=api),
+            timeout=timeout,
+            include_unconfigured=include_unconfigured,
+            include_non_scheduled=include_non_scheduled,
+            vm_filter=vm_filter,
+        )
+    finally:
+        session_pool.release(target, profile)
+    registry = CollectorRegistry()
+    # Probes keep no state, last successful jobs older than the last job aren't known
+    collector = AltaroCollector(series_rules, policies)
+    registry.register(collector)
+    collector.update([server_snapshot])
+    return prometheus_client.generate_latest(registry)
@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.records"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Optional
+import sys
+
+
+# vms/list fields parse_vm() reads, in a fixed order
+SOURCE_FIELDS = (
+    "VirtualMachineName",
+    "HostName",
+    "HypervisorVirtualMachineUuid",
+    "LastBackupTime",
+    "LastOffsiteCopyTime",
+    "LastBackupDuration",
+    "LastOffsiteCopyDuration",
+    "LastBackupTransferSizeCompressed",
+    "LastBackupTransferSizeUncompressed",
+    "LastOffsiteCopyTransferSizeCompressed",
+    "LastOffsiteCopyTransferSizeUncompressed",
+    "LastBackupResult",
+    "LastOffsiteCopyResult",
+    "NextBackupTime",
+    "NextOffsiteCopyTime",
+)
+
+
+def vm_fingerprint(vm: dict) -> int:
+    """
+    Hash of the vms/list VM object values that matter to us
+    A single int is enough to tell whether a VM changed, no need to keep the VM object around
+    """
+    return hash(tuple(vm.get(field) for field in SOURCE_FIELDS))
+
+
+def intern_label(value: Optional[str]) -> Optional[str]:
+    """
+    Label strings are interned so every record and poll shares a single copy of each
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class VMRecord:
+    """
+    Exported values of one VM
+    Slotted and with interned labels, so a VM held by VMInventory costs about 650 to 850 bytes, values and
+    change detection data included, against about 1.8 KB with a dict record and the raw vms/list object
+    (see benchmarks/bench_memory.py)
+    """
+
+    __slots__ = (
+        "vmname",
+        "hostname",
+        "vmuuid",
+        "lastbackup_timestamp",
+        "lastoffsitecopy_timestamp",
+        "lastbackup_duration",
+        "lastoffsitecopy_duration",
+        "lastbackup_transfersize_compressed",
+        "lastbackup_transfersize_uncompressed",
+        "lastoffsitecopy_transfersize_compressed",
+        "lastoffsitecopy_transfersize_uncompressed",
+        "lastbackup_result",
+        "lastoffsitecopy_result",
+        "nextbackup_timestamp",
+        "nextoffsitecopy_timestamp",
+        "lastsuccessfulbackup_timestamp",
+        "lastsuccessfuloffsitecopy_timestamp",
+    )
+
+    def __init__(
+        self,
+        vmname: str,
+        hostname: str,
+        vmuuid: str,
+        lastbackup_timestamp: Optional[float] = None,
+        lastoffsitecopy_timestamp: Optional[float] = None,
+        lastbackup_duration: Optional[float] = None,
+        lastoffsitecopy_duration: Optional[float] = None,
+        lastbackup_transfersize_compressed: Optional[int] = None,
+        lastbackup_transfersize_uncompressed: Optional[int] = None,
+        lastoffsitecopy_transfersize_compressed: Optional[int] = None,
+        lastoffsitecopy_transfersize_uncompressed: Optional[int] = None,
+        lastbackup_result: Optional[int] = None,
+        lastoffsitecopy_result: Optional[int] = None,
+        nextbackup_timestamp: Optional[float] = None,
+        nextoffsitecopy_timestamp: Optional[float] = None,
+        lastsuccessfulbackup_timestamp: Optional[float] = None,
+        lastsuccessfuloffsitecopy_timestamp: Optional[float] = None,
+    ):
+        self.vmname = intern_label(vmname)
+        self.hostname = intern_label(hostname)
+        self.vmuuid = intern_label(vmuuid)
+        self.lastbackup_timestamp = lastbackup_timestamp
+        self.lastoffsitecopy_timestamp = lastoffsitecopy_timestamp
+        self.lastbackup_duration = lastbackup_duration
+        self.lastoffsitecopy_duration = lastoffsitecopy_duration
+        self.lastbackup_transfersize_compressed = lastbackup_transfersize_compressed
+        self.lastbackup_transfersize_uncompressed = lastbackup_transfersize_uncompressed
+        self.lastoffsitecopy_transfersize_compressed = (
+            lastoffsitecopy_transfersize_compressed
+        )
+        self.lastoffsitecopy_transfersize_uncompressed = (
+            lastoffsitecopy_transfersize_uncompressed
+        )
+        self.lastbackup_result = lastbackup_result
+        self.lastoffsitecopy_result = lastoffsitecopy_result
+        self.nextbackup_timestamp = nextbackup_timestamp
+        self.nextoffsitecopy_timestamp = nextoffsitecopy_timestamp
+        self.lastsuccessfulbackup_timestamp = lastsuccessfulbackup_timestamp
+        self.lastsuccessfuloffsitecopy_timestamp = lastsuccessfuloffsitecopy_timestamp
+
+    def keep_last_success(self, previous: "VMRecord"):
+        """
+        Altaro only reports the last job of a VM, so last successful job times are carried over
+        from the previous record of the same VM when the last job failed
+        """
+        if self.lastsuccessfulbackup_timestamp is None:
+            self.lastsuccessfulbackup_timestamp = (
+                previous.lastsuccessfulbackup_timestamp
+            )
+        if self.lastsuccessfuloffsitecopy_timestamp is None:
+            self.lastsuccessfuloffsitecopy_timestamp = (
+                previous.lastsuccessfuloffsitecopy_timestamp
+            )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, VMRecord):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return f"VMRecord({self.vmname!r}, {self.hostname!r}, {self.vmuuid!r})"
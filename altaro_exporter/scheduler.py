@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.scheduler"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable
+from logging import getLogger
+from prometheus_client import Gauge
+from altaro_exporter.records import VMRecord
+
+
+logger = getLogger()
+
+
+REFRESH_INTERVAL = Gauge(
+    "altaro_refresh_interval_seconds",
+    "Seconds between the last refresh and the next planned one",
+)
+
+# Jobs rarely complete faster than this ratio of their previous duration
+EARLY_COMPLETION_RATIO = 0.7
+
+
+class AdaptiveSchedule:
+    """
+    Plans the next poll from Altaro job schedules instead of polling at a fixed interval
+
+    A job may complete as soon as its NextBackupTime / NextOffsiteCopyTime plus 70% of the duration of its previous run
+    Once that time passed and the job result didn't show up yet, polls happen every min_interval seconds,
+    for up to twice the previous duration plus completion_window seconds, after which the job is considered not running
+    Between jobs, the poller sleeps until the next expected completion, never longer than max_interval
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 15,
+        max_interval: float = 900,
+        completion_window: float = 900,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.completion_window = completion_window
+
+    def _next_poll(self, next_time, last_time, duration, now: float) -> float:
+        """
+        Timestamp at which one job should be polled for, or None if it doesn't need to be
+        """
+        if next_time is None:
+            return None
+        expected_end = next_time + (duration or 0) * EARLY_COMPLETION_RATIO
+        if expected_end > now:
+            return expected_end
+        if last_time is not None and last_time >= next_time:
+            # Job already reported, waiting for Altaro to schedule the next one
+            return None
+        if now - next_time > (duration or 0) * 2 + self.completion_window:
+            return None
+        return now
+
+    def next_interval(self, records: Iterable[VMRecord], now: float) -> float:
+        next_poll = now + self.max_interval
+        for record in records:
+            for next_time, last_time, duration in (
+                (
+                    record.nextbackup_timestamp,
+                    record.lastbackup_timestamp,
+                    record.lastbackup_duration,
+                ),
+                (
+                    record.nextoffsitecopy_timestamp,
+                    record.lastoffsitecopy_timestamp,
+                    record.lastoffsitecopy_duration,
+                ),
+            ):
+                poll_at = self._next_poll(next_time, last_time, duration, now)
+                if poll_at is not None and poll_at < next_poll:
+                    next_poll = poll_at
+        return min(max(next_poll - now, self.min_interval), self.max_interval)
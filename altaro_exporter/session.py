@@ -0,0 +1,144 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.session"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Optional
+from pathlib import Path
+from logging import getLogger
+import os
+import time
+from cryptidy import symmetric_encryption as enc
+from altaro_exporter.configuration import AES_KEY, ID_STRING
+from altaro_exporter.altaro_api import AsyncAltaroAPI
+
+
+logger = getLogger()
+
+
+# Refresh sessions this many seconds before they would expire
+REFRESH_MARGIN = 60
+
+
+class SessionStore:
+    """
+    Altaro session ids persisted encrypted on disk, keyed by server name
+    Allows a restarted exporter to resume its sessions instead of being locked out by Altaro API
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._sessions = None
+
+    def _load(self) -> dict:
+        if self._sessions is not None:
+            return self._sessions
+        self._sessions = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_handle:
+                _, sessions = enc.decrypt_message_hf(
+                    file_handle.read(), AES_KEY, ID_STRING, ID_STRING
+                )
+            if isinstance(sessions, dict):
+                self._sessions = sessions
+        except FileNotFoundError:
+            pass
+        except Exception as exc:
+            logger.warning(f"Cannot load session file {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+        return self._sessions
+
+    def get(self, name: str) -> Optional[dict]:
+        return self._load().get(name)
+
+    def set(self, name: str, session_id: Optional[str], started: Optional[float]):
+        sessions = self._load()
+        if session_id:
+            entry = {"session_id": session_id, "started": started}
+        else:
+            entry = None
+        if sessions.get(name) == entry:
+            return
+        if entry:
+            sessions[name] = entry
+        else:
+            sessions.pop(name, None)
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file_handle:
+                file_handle.write(
+                    enc.encrypt_message_hf(
+                        sessions, AES_KEY, ID_STRING, ID_STRING
+                    ).decode("utf-8")
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            logger.error(f"Cannot save session file {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+
+
+class SessionManager:
+    """
+    Keeps track of an Altaro API session age
+    Sessions are renewed between polls before they expire, so polls don't pay a failed call plus re-authentication
+    """
+
+    def __init__(
+        self,
+        api: AsyncAltaroAPI,
+        name: str,
+        store: Optional[SessionStore] = None,
+        max_age: int = 1200,
+    ):
+        self.api = api
+        self.name = name
+        self.store = store
+        self.max_age = max_age
+
+    @property
+    def age(self) -> Optional[float]:
+        if not self.api.session_id or not self.api.session_started:
+            return None
+        return time.time() - self.api.session_started
+
+    def resume(self) -> bool:
+        """
+        Reuse a persisted session if it should still be valid
+        If Altaro API rejects it anyway, the usual re-authentication happens on first call
+        """
+        if not self.store or self.api.session_id:
+            return False
+        entry = self.store.get(self.name)
+        if not entry:
+            return False
+        started = entry.get("started") or 0
+        if time.time() - started >= self.max_age - REFRESH_MARGIN:
+            logger.info(f"Persisted session for {self.name} is too old to resume")
+            return False
+        logger.info(f"Resuming persisted Altaro session for {self.name}")
+        self.api.session_id = entry["session_id"]
+        self.api.session_started = started
+        return True
+
+    def persist(self):
+        if self.store:
+            self.store.set(self.name, self.api.session_id, self.api.session_started)
+
+    async def maintain(self, next_use_in: float = 0):
+        """
+        Renew the session now if it would expire before its next use, then persist it
+        """
+        age = self.age
+        if age is not None and age + next_use_in + REFRESH_MARGIN >= self.max_age:
+            logger.info(f"Renewing Altaro session for {self.name} before it expires")
+            await self.api.renew_session()
+        self.persist()
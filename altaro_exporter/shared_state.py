@@ -0,0 +1,207 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.shared_state"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Optional
+from pathlib import Path
+from logging import getLogger
+import os
+import json
+import mmap
+import struct
+from altaro_exporter.exposition import Exposition
+from altaro_exporter.poller import Snapshot
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+logger = getLogger()
+
+
+# magic, format version, timestamp, success, server timestamps length,
+# identity crc32, identity length, gzip length, zstd length (-1 if none)
+HEADER = struct.Struct("<4sBd?IIqqq")
+MAGIC = b"ALTX"
+FORMAT_VERSION = 3
+
+
+class LeaderLock:
+    """
+    Non blocking exclusive lock on a file, so only one process per host polls Altaro API
+    The lock is released by the OS if the holding process dies
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file_handle = None
+
+    @property
+    def held(self) -> bool:
+        return self._file_handle is not None
+
+    def acquire(self) -> bool:
+        if self._file_handle is not None:
+            return True
+        file_handle = open(self.path, "a+b")
+        try:
+            if fcntl:
+                fcntl.flock(file_handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file_handle.seek(0)
+                msvcrt.locking(file_handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file_handle.close()
+            return False
+        self._file_handle = file_handle
+        logger.info(f"Acquired poller lock {self.path}")
+        return True
+
+    def release(self):
+        if self._file_handle is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._file_handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file_handle.seek(0)
+                msvcrt.locking(self._file_handle.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError as exc:
+            logger.warning(f"Cannot release poller lock {self.path}: {exc}")
+        self._file_handle.close()
+        self._file_handle = None
+
+
+class SharedSnapshot:
+    """
+    Publishes the poller snapshot to a file other workers mmap
+    Files are replaced atomically, readers only reload when the file changed
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file_id = None
+        self._snapshot = None
+
+    def publish(self, snapshot: Snapshot) -> bool:
+        exposition = snapshot.exposition
+        server_timestamps = json.dumps(snapshot.server_timestamps).encode("utf-8")
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            snapshot.timestamp,
+            snapshot.success,
+            len(server_timestamps),
+            exposition.crc32,
+            len(exposition.identity),
+            len(exposition.gzip),
+            len(exposition.zstd) if exposition.zstd is not None else -1,
+        )
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as file_handle:
+                file_handle.write(header)
+                file_handle.write(server_timestamps)
+                file_handle.write(exposition.identity)
+                file_handle.write(exposition.gzip)
+                if exposition.zstd is not None:
+                    file_handle.write(exposition.zstd)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as exc:
+            logger.error(f"Cannot publish snapshot to {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def clear(self):
+        """
+        Remove the published snapshot, called by a new leader since it may come from an earlier run
+        Readers keep serving the snapshot they already loaded
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.error(f"Cannot remove shared snapshot {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+
+    def load(self) -> Optional[Snapshot]:
+        """
+        Returns the latest published snapshot, or None if none was published yet
+        Only costs a stat() call when the snapshot didn't change
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return self._snapshot
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id == self._file_id:
+            return self._snapshot
+        try:
+            with open(self.path, "rb") as file_handle, mmap.mmap(
+                file_handle.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                (
+                    magic,
+                    version,
+                    timestamp,
+                    success,
+                    server_timestamps_len,
+                    crc32,
+                    identity_len,
+                    gzip_len,
+                    zstd_len,
+                ) = HEADER.unpack_from(data, 0)
+                if magic != MAGIC or version != FORMAT_VERSION:
+                    logger.error(f"Bogus shared snapshot file {self.path}")
+                    return self._snapshot
+                offset = HEADER.size
+                server_timestamps = tuple(
+                    (name, timestamp)
+                    for name, timestamp in json.loads(
+                        data[offset : offset + server_timestamps_len]
+                    )
+                )
+                offset += server_timestamps_len
+                identity = data[offset : offset + identity_len]
+                offset += identity_len
+                gzip_content = data[offset : offset + gzip_len]
+                offset += gzip_len
+                zstd_content = (
+                    data[offset : offset + zstd_len] if zstd_len >= 0 else None
+                )
+        except (OSError, ValueError, struct.error) as exc:
+            logger.error(f"Cannot load shared snapshot from {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            return self._snapshot
+        self._snapshot = Snapshot(
+            exposition=Exposition(
+                identity=identity,
+                gzip=gzip_content,
+                zstd=zstd_content,
+                crc32=crc32,
+            ),
+            timestamp=timestamp,
+            success=success,
+            server_timestamps=server_timestamps,
+        )
+        self._file_id = file_id
+        return self._snapshot
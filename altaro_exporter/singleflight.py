@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.singleflight"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Any, Callable, Hashable
+from logging import getLogger
+import asyncio
+from prometheus_client import Counter
+
+
+logger = getLogger()
+
+
+COALESCED_SCRAPES = Counter(
+    "altaro_coalesced_scrapes",
+    "Number of requests that joined an already running Altaro API call instead of making their own",
+    ["endpoint"],
+)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls sharing a key into one in-flight call whose result every caller gets
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self._calls = {}
+
+    async def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            COALESCED_SCRAPES.labels(self.endpoint).inc()
+            logger.debug(f"Joining in-flight {self.endpoint} call for {key}")
+        else:
+            task = asyncio.get_running_loop().create_task(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        # Shielded so a cancelled caller doesn't cancel the call other callers wait for
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
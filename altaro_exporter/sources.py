@@ -0,0 +1,105 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.sources"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Dict, Iterable, List, Optional
+from logging import getLogger
+from abc import ABC, abstractmethod
+from prometheus_client.registry import Collector
+
+
+logger = getLogger()
+
+
+class DataSource(Collector, ABC):
+    """
+    A kind of Altaro data, polled from every Altaro server on its own interval with its own timeout
+    The poller refreshes each source in its own task, so a slow source never delays the others
+
+    Subclasses implement poll() for a single server, failed() for polls that raised, update() with
+    the results of all servers, and collect() to export them
+    Sources missing one of the abstract methods can't be instantiated
+    """
+
+    # Source name, as found in options.sources of the config file
+    name = None
+
+    def __init__(self, interval: float = 60, timeout: float = 60):
+        self.interval = interval
+        self.timeout = timeout
+        # Time of last refresh, successful or not
+        self.timestamp: Optional[float] = None
+        self.success = False
+        # server name: timestamp of last successful poll
+        self.last_success: Dict[str, float] = {}
+
+    def due_in(self, now: float) -> float:
+        """
+        Seconds until this source needs a refresh, 0 if it's due
+        """
+        if self.timestamp is None:
+            return 0
+        return max(self.timestamp + self.interval - now, 0)
+
+    @abstractmethod
+    async def poll(self, server):
+        """
+        Fetch this source from one AltaroServer, giving up after self.timeout seconds
+        """
+
+    @abstractmethod
+    def failed(self, server):
+        """
+        Result handed to update() for an AltaroServer whose poll() raised
+        """
+
+    @abstractmethod
+    def update(self, results: Iterable, now: float) -> bool:
+        """
+        Replace exported data with poll() results of all servers, returns whether all polls succeeded
+        """
+
+    def load(self, servers: List) -> bool:
+        """
+        Load data of AltaroServers saved by a previous run, returns whether there's anything to serve
+        Runs in an executor
+        """
+        return False
+
+    def save(self):
+        """
+        Save data after a refresh, runs in an executor
+        """
+        pass
+
+    def collect(self):
+        return []
+
+
+def read_source_options(config_dict, defaults: Dict[str, dict]) -> Dict[str, dict]:
+    """
+    Interval and timeout of every known source, from options.sources.<name> of the config file
+    defaults: source name: {"interval": x, "timeout": y}
+    """
+    for name in config_dict.g("options.sources", default=None) or {}:
+        if name not in defaults:
+            logger.error(f"Unknown data source {name} in config file, ignoring it")
+    return {
+        name: {
+            key: float(
+                config_dict.g(f"options.sources.{name}.{key}", default=default[key])
+            )
+            for key in ("interval", "timeout")
+        }
+        for name, default in defaults.items()
+    }
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.timestamps"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Dict, Optional
+from logging import getLogger
+import calendar
+import datetime
+import time
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    # python < 3.9
+    ZoneInfo = None
+
+
+logger = getLogger()
+
+
+# None means Altaro times are interpreted in local time of the exporter host
+_TIMEZONE = None
+
+# Altaro time: timestamp, many VMs of a vms/list result share job schedules hence the same times
+# Cleared after every poll so it never holds memory between polls, and reset once MAX_CACHED_TIMES is reached
+_PARSED_TIMES: Dict[str, Optional[float]] = {}
+MAX_CACHED_TIMES = 1 << 18
+
+
+def set_altaro_timezone(timezone: Optional[str] = None):
+    """
+    Set timezone Altaro times are expressed in
+    Accepts "local" (or None), "UTC", or an IANA timezone name like "Europe/Paris"
+    """
+    global _TIMEZONE
+
+    if not timezone or str(timezone).lower() == "local":
+        _TIMEZONE = None
+    elif str(timezone).upper() == "UTC":
+        _TIMEZONE = datetime.timezone.utc
+    elif ZoneInfo is None:
+        logger.error(f"Cannot use timezone {timezone} without zoneinfo, using local")
+        _TIMEZONE = None
+    else:
+        try:
+            _TIMEZONE = ZoneInfo(timezone)
+        except Exception as exc:
+            logger.error(f"Unknown timezone {timezone}, using local: {exc}")
+            _TIMEZONE = None
+    clear_altaro_time_cache()
+
+
+def clear_altaro_time_cache():
+    _PARSED_TIMES.clear()
+
+
+def _parse_altaro_time(altaro_time: str) -> Optional[float]:
+    # Fixed width format, ex 2024-08-13-01-53-14
+    if (
+        len(altaro_time) != 19
+        or altaro_time[4] != "-"
+        or altaro_time[7] != "-"
+        or altaro_time[10] != "-"
+        or altaro_time[13] != "-"
+        or altaro_time[16] != "-"
+    ):
+        logger.warning(f"Cannot parse Altaro time {altaro_time}")
+        return None
+    try:
+        year = int(altaro_time[0:4])
+        month = int(altaro_time[5:7])
+        day = int(altaro_time[8:10])
+        hour = int(altaro_time[11:13])
+        minute = int(altaro_time[14:16])
+        second = int(altaro_time[17:19])
+        if _TIMEZONE is None:
+            return float(
+                time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+            )
+        if _TIMEZONE is datetime.timezone.utc:
+            return float(
+                calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+            )
+        return datetime.datetime(
+            year, month, day, hour, minute, second, tzinfo=_TIMEZONE
+        ).timestamp()
+    except (ValueError, OverflowError) as exc:
+        logger.warning(f"Cannot parse Altaro time {altaro_time}: {exc}")
+        return None
+
+
+def parse_altaro_time(altaro_time: Optional[str]) -> Optional[float]:
+    """
+    Converts Altaro time, ex 2024-08-13-01-53-14, to a timestamp
+    Results are memoized until clear_altaro_time_cache() is called
+    """
+    if not altaro_time:
+        return None
+    if not isinstance(altaro_time, str):
+        logger.warning(f"Cannot parse Altaro time {altaro_time}")
+        return None
+    try:
+        return _PARSED_TIMES[altaro_time]
+    except KeyError:
+        pass
+    if len(_PARSED_TIMES) >= MAX_CACHED_TIMES:
+        _PARSED_TIMES.clear()
+    timestamp = _PARSED_TIMES[altaro_time] = _parse_altaro_time(altaro_time)
+    return timestamp
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.vm_store"
+__author__ = "Orsiris de Jong"
+__site__ = "https://www.github.com/netinvent/altaro_exporter"
+__description__ = "Altaro API Prometheus data exporter"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+from typing import Iterable, List, Tuple
+from pathlib import Path
+from logging import getLogger
+import marshal
+import os
+import struct
+import time
+from altaro_exporter.records import VMRecord
+
+
+logger = getLogger()
+
+
+# magic, format version, marshal version, saved timestamp
+HEADER = struct.Struct("<4sBBd")
+MAGIC = b"ALTV"
+FORMAT_VERSION = 2
+
+# (server name, timestamp of last successful poll, VM records)
+ServerRecords = Tuple[str, float, Tuple[VMRecord, ...]]
+
+
+class VMStore:
+    """
+    Last good VM records of every server, persisted so a restarted exporter serves data right away
+    Records are stored as marshalled tuples, which load an order of magnitude faster than JSON or pickle
+    Tuples are rebuilt into VMRecords by position, so the file also holds VMRecord slot names and is
+    ignored when they changed
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def save(self, servers: Iterable[ServerRecords]) -> bool:
+        data = (
+            VMRecord.__slots__,
+            [
+                (
+                    name,
+                    timestamp,
+                    [
+                        tuple(getattr(record, slot) for slot in VMRecord.__slots__)
+                        for record in records
+                    ],
+                )
+                for name, timestamp, records in servers
+            ],
+        )
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, time.time())
+        tmp_path = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as file_handle:
+                file_handle.write(header)
+                marshal.dump(data, file_handle)
+            os.replace(tmp_path, self.path)
+            return True
+        except (OSError, ValueError) as exc:
+            logger.error(f"Cannot save VM records to {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def load(self) -> List[ServerRecords]:
+        """
+        Returns saved server records, or an empty list if there are none or they can't be read
+        """
+        try:
+            with open(self.path, "rb") as file_handle:
+                content = file_handle.read()
+        except FileNotFoundError:
+            return []
+        except OSError as exc:
+            logger.error(f"Cannot load VM records from {self.path}: {exc}")
+            return []
+        try:
+            magic, version, marshal_version, _ = HEADER.unpack_from(content, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                logger.error(f"Bogus VM records file {self.path}")
+                return []
+            if marshal_version != marshal.version:
+                logger.info(
+                    f"VM records file {self.path} was written by another Python version, ignoring it"
+                )
+                return []
+            fields, data = marshal.loads(content[HEADER.size :])
+            if tuple(fields) != VMRecord.__slots__:
+                logger.info(
+                    f"VM records file {self.path} was written with other VM record fields, ignoring it"
+                )
+                return []
+            return [
+                (name, timestamp, tuple(VMRecord(*values) for values in records))
+                for name, timestamp, records in data
+            ]
+        except (struct.error, EOFError, ValueError, TypeError) as exc:
+            logger.error(f"Cannot load VM records from {self.path}: {exc}")
+            logger.debug("Trace:", exc_info=True)
+            return []
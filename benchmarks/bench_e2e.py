@@ -0,0 +1,333 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.bench_e2e"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+End to end benchmark suite against the fake Altaro REST API (see fake_altaro.py)
+Measures list_vms throughput, exposition render time, memory per VM
+and /metrics latency under concurrent scrapers of an exporter running in a subprocess
+
+Results are stored as JSON, and compared against a previous result file when --baseline is given
+Exits with an error when a result regressed by more than --tolerance
+
+Usage: python benchmarks/bench_e2e.py [--vms 10000] [--output results.json] [--baseline previous.json]
+"""
+
+
+import sys
+import os
+
+# Insert parent dir as path se we get to use altaro_exporter as package
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+from typing import List
+import asyncio
+import json
+import platform
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser
+import httpx
+from prometheus_client import CollectorRegistry
+from altaro_exporter.altaro_api import AsyncAltaroAPI, ijson
+from altaro_exporter.collector import AltaroCollector
+from altaro_exporter.exposition import render_exposition
+from altaro_exporter.inventory import VMInventory
+from altaro_exporter.poller import AltaroServer, poll_server
+from fake_altaro import FakeAltaro
+import bench_memory
+
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+EXPORTER_CONFIG = """
+altaro_server:
+  name: bench
+  rest_host: {host}
+  rest_port: {port}
+  rest_path: /api/rest
+  rest_scheme: http
+  server_port: 36014
+  server_address: localhost
+  username: bench
+  password: bench
+  domain: .
+options:
+  refresh_interval: 3600
+  state_dir: {state_dir}
+http_server:
+  no_auth: true
+  username:
+  password:
+"""
+
+EXPORTER_SCRIPT = """
+import sys
+import uvicorn
+from altaro_exporter.configuration import load_config
+from altaro_exporter.metrics import create_app
+config_file, port = sys.argv[1:3]
+app = create_app(load_config(config_file), config_file)
+uvicorn.run(app, host="127.0.0.1", port=int(port), log_level="warning")
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * percentile), len(values) - 1)]
+
+
+def _create_api(host: str, port: int, stream_parse: bool = False) -> AsyncAltaroAPI:
+    return AsyncAltaroAPI(
+        altaro_rest_host=host,
+        altaro_rest_port=port,
+        altaro_rest_scheme="http",
+        altaro_rest_path="/api/rest",
+        username="bench",
+        password="bench",
+        domain=".",
+        cert_verify=False,
+        read_timeout=300,
+        stream_parse=stream_parse,
+        name="bench",
+    )
+
+
+async def bench_list_vms(
+    host: str, port: int, count: int, iterations: int, stream_parse: bool
+) -> dict:
+    """
+    Polls through poll_server() so JSON decoding and inventory merging are included
+    First poll parses every VM, the following ones only compare them
+    """
+    api = _create_api(host, port, stream_parse=stream_parse)
+    server = AltaroServer("bench", api, inventory=VMInventory("bench"))
+    durations = []
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            snapshot = await poll_server(server, timeout=300)
+            durations.append(time.perf_counter() - start)
+            assert snapshot.success, "Polling fake Altaro server failed"
+    finally:
+        await api.close()
+    return {
+        "vms": len(snapshot.vms),
+        "first_poll_seconds": durations[0],
+        "poll_seconds": min(durations[1:] or durations),
+        "vms_per_second": len(snapshot.vms) / min(durations[1:] or durations),
+    }
+
+
+async def bench_render(host: str, port: int, repeat: int = 3) -> dict:
+    api = _create_api(host, port)
+    try:
+        snapshot = await poll_server(
+            AltaroServer("bench", api, inventory=VMInventory("bench")), timeout=300
+        )
+    finally:
+        await api.close()
+    registry = CollectorRegistry()
+    collector = AltaroCollector()
+    registry.register(collector)
+    collector.update([snapshot])
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exposition = render_exposition(registry)
+        durations.append(time.perf_counter() - start)
+    return {
+        "render_seconds": min(durations),
+        "exposition_bytes": len(exposition.identity),
+        "exposition_gzip_bytes": len(exposition.gzip),
+    }
+
+
+async def _scrape(
+    client: httpx.AsyncClient, url: str, requests: int, latencies: List[float]
+):
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers={"Accept-Encoding": "gzip"})
+        await response.aread()
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, f"/metrics answered {response.status_code}"
+
+
+async def bench_scrapes(
+    host: str, port: int, scrapers: int, requests: int, startup_timeout: int = 120
+) -> dict:
+    """
+    Runs the exporter in a subprocess so scrapers and exporter don't share a GIL
+    """
+    with tempfile.TemporaryDirectory() as state_dir:
+        config_file = os.path.join(state_dir, "altaro_exporter.yaml")
+        with open(config_file, "w", encoding="utf-8") as file_handle:
+            file_handle.write(
+                EXPORTER_CONFIG.format(host=host, port=port, state_dir=state_dir)
+            )
+        exporter_port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-c", EXPORTER_SCRIPT, config_file, str(exporter_port)],
+            cwd=ROOT_DIR,
+            stdout=subprocess.DEVNULL,
+        )
+        url = f"http://127.0.0.1:{exporter_port}/metrics"
+        try:
+            async with httpx.AsyncClient(
+                timeout=300, limits=httpx.Limits(max_connections=scrapers)
+            ) as client:
+                deadline = time.monotonic() + startup_timeout
+                start = time.perf_counter()
+                while True:
+                    try:
+                        response = await client.get(url)
+                        if response.status_code == 200:
+                            break
+                    except httpx.TransportError:
+                        pass
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise RuntimeError("Exporter did not start")
+                    await asyncio.sleep(0.1)
+                first_scrape_seconds = time.perf_counter() - start
+
+                latencies = []
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *(
+                        _scrape(client, url, requests, latencies)
+                        for _ in range(scrapers)
+                    )
+                )
+                elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return {
+        "first_scrape_seconds": first_scrape_seconds,
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": _percentile(latencies, 0.95) * 1000,
+        "latency_p99_ms": _percentile(latencies, 0.99) * 1000,
+        "requests_per_second": len(latencies) / elapsed,
+    }
+
+
+async def run(
+    vms: int,
+    iterations: int = 5,
+    scrapers: int = 16,
+    requests: int = 50,
+    latency: float = 0,
+) -> dict:
+    fake = FakeAltaro(vms=vms, latency=latency, seed=42)
+    host, port = fake.start()
+    results = {}
+    try:
+        for name, value in (
+            await bench_list_vms(host, port, vms, iterations, stream_parse=False)
+        ).items():
+            results[f"list_vms_{name}"] = value
+        if ijson:
+            for name, value in (
+                await bench_list_vms(host, port, vms, iterations, stream_parse=True)
+            ).items():
+                results[f"list_vms_stream_{name}"] = value
+        results.update(await bench_render(host, port))
+        results["memory_bytes_per_vm"] = bench_memory.run(vms)["slotted_records"]
+        for name, value in (
+            await bench_scrapes(host, port, scrapers, requests)
+        ).items():
+            results[f"metrics_{name}"] = value
+    finally:
+        fake.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """
+    Print results next to baseline ones, returns False if any regressed beyond tolerance
+    Values named *_per_second are better when higher, all others when lower
+    """
+    ok = True
+    for name, value in results.items():
+        previous = baseline.get(name)
+        if not isinstance(previous, (int, float)) or not previous:
+            print(f"{name:<40} {value:14.4f}")
+            continue
+        change = (value - previous) / previous
+        higher_is_better = name.endswith("_per_second")
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        flag = "REGRESSION" if regressed else ""
+        print(f"{name:<40} {value:14.4f} {previous:14.4f} {change:+8.1%} {flag}")
+        if regressed:
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="End to end altaro_exporter benchmarks")
+    parser.add_argument("--vms", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--scrapers", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Seconds added to every API call"
+    )
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--baseline", type=str, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(
+        run(
+            args.vms,
+            iterations=args.iterations,
+            scrapers=args.scrapers,
+            requests=args.requests,
+            latency=args.latency,
+        )
+    )
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)["results"]
+    ok = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            json.dump(
+                {
+                    "meta": {
+                        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "vms": args.vms,
+                        "scrapers": args.scrapers,
+                        "requests": args.requests,
+                        "latency": args.latency,
+                    },
+                    "results": results,
+                },
+                file_handle,
+                indent=2,
+            )
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.bench_memory"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Memory held per VM by the VM inventory, measured with tracemalloc on synthetic fleets
+Compares slotted VMRecords with the former layout (raw vms/list object + dict record per VM)
+Exits with an error if the per VM footprint exceeds MAX_BYTES_PER_VM, tests/test_memory.py checks it too
+Parsed Altaro times are cleared from their cache like after every poll, they'd otherwise count against small fleets
+
+Usage: python benchmarks/bench_memory.py [fleet size [fleet size ...]]
+"""
+
+
+import sys
+import os
+
+# Insert parent dir as path se we get to use altaro_exporter as package
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+import gc
+import json
+import time
+import tracemalloc
+from altaro_exporter.collector import AltaroCollector, ServerSnapshot
+from altaro_exporter.inventory import VMInventory, vm_key
+from altaro_exporter.records import VMRecord
+from altaro_exporter.timestamps import clear_altaro_time_cache
+from fake_altaro import make_fleet
+
+
+# Budget of a VM in the inventory, labels and change detection data included
+MAX_BYTES_PER_VM = 1024
+
+
+def make_vms_list(count: int, hosts: int = 50) -> bytes:
+    """
+    vms/list response body of a synthetic fleet
+    """
+    return json.dumps(
+        {"Success": True, "VirtualMachines": make_fleet(count, hosts=hosts)}
+    ).encode("utf-8")
+
+
+def dict_inventory(vms: list) -> dict:
+    """
+    Former layout: raw vms/list object and a dict record kept per VM
+    """
+    inventory = {}
+    now = time.time()
+    for vm in vms:
+        record = VMRecord(
+            vm["VirtualMachineName"],
+            vm["HostName"],
+            vm["HypervisorVirtualMachineUuid"],
+        )
+        inventory[vm_key(vm)] = (
+            vm,
+            {slot: getattr(record, slot) for slot in VMRecord.__slots__},
+            now,
+        )
+    return inventory
+
+
+def slotted_inventory(vms: list):
+    """
+    Current layout: VMInventory of slotted VMRecords
+    """
+    inventory = VMInventory("bench")
+    records = inventory.update(vms)
+    # As done after every poll
+    clear_altaro_time_cache()
+    assert len(records) == len(vms)
+    assert isinstance(records[0], VMRecord)
+    return inventory, records
+
+
+def measure(body: bytes, build) -> int:
+    """
+    Bytes still allocated by build() once the decoded response is dropped
+    """
+    gc.collect()
+    tracemalloc.start()
+    vms = json.loads(body)["VirtualMachines"]
+    kept = build(vms)
+    del vms
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def run(count: int):
+    body = make_vms_list(count)
+    results = {
+        "slotted_records": measure(body, slotted_inventory) / count,
+        "dict_records": measure(body, dict_inventory) / count,
+    }
+
+    # Labels must be shared between records of the same host
+    inventory = VMInventory("bench")
+    records = inventory.update(json.loads(body)["VirtualMachines"])
+    assert records[0].hostname is records[50].hostname
+
+    # Rendering reads records without copying them
+    collector = AltaroCollector()
+    collector.update([ServerSnapshot("bench", 0, records, True)])
+    start = time.perf_counter()
+    samples = sum(len(family.samples) for family in collector.collect())
+    results["collect_seconds"] = time.perf_counter() - start
+    results["samples"] = samples
+    return results
+
+
+if __name__ == "__main__":
+    counts = [int(count) for count in sys.argv[1:]] or [10000, 100000]
+    failed = False
+    for count in counts:
+        results = run(count)
+        print(
+            f"{count:>7} VMs  slotted {results['slotted_records']:7.0f} B/VM  "
+            f"dicts {results['dict_records']:7.0f} B/VM  "
+            f"collect {results['collect_seconds']:.2f}s ({results['samples']} samples)"
+        )
+        if results["slotted_records"] > MAX_BYTES_PER_VM:
+            print(f"{count} VMs: exceeds {MAX_BYTES_PER_VM} bytes per VM")
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.bench_schedule"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Simulates days of nightly backup jobs and compares fixed interval polling with the adaptive schedule
+Reports the number of vms/list calls per day, and how long after a job completed its result got polled
+
+Jobs of every VM run daily in one of --windows backup windows, with a start stagger and a duration
+varying by 30% from one run to the next
+
+Usage: python benchmarks/bench_schedule.py [--vms 1000] [--days 3] [--windows 2] [--min-interval 15] [--max-interval 900]
+"""
+
+
+import sys
+import os
+
+# Insert parent dir as path se we get to use altaro_exporter as package
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+from typing import List
+import random
+import statistics
+from argparse import ArgumentParser
+from altaro_exporter.records import VMRecord
+from altaro_exporter.scheduler import AdaptiveSchedule
+
+
+DAY = 86400
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * percentile), len(values) - 1)]
+
+
+def simulate(
+    vms: int,
+    days: int,
+    windows: int,
+    interval: float = 60,
+    schedule: AdaptiveSchedule = None,
+    seed: int = 42,
+) -> dict:
+    rng = random.Random(seed)
+    # Backup windows start at 22:00 then every 3 hours
+    offsets = []
+    durations = []
+    records = []
+    for index in range(vms):
+        offset = (22 + 3 * (index % windows)) * 3600 + rng.randint(0, 1800)
+        duration = rng.randint(60, 3600)
+        offsets.append(offset)
+        durations.append(duration)
+        records.append(
+            VMRecord(
+                f"vm-{index:06d}",
+                "hyperv",
+                str(index),
+                lastbackup_timestamp=offset - DAY,
+                lastbackup_duration=duration,
+                nextbackup_timestamp=offset,
+            )
+        )
+    completions = []
+    for day in range(days):
+        for index in range(vms):
+            start = day * DAY + offsets[index]
+            duration = durations[index] * rng.uniform(0.7, 1.3)
+            completions.append((start + duration, index, start, duration))
+    completions.sort()
+
+    now = 0
+    polls = 0
+    delays = []
+    pending = 0
+    end = days * DAY
+    while now < end:
+        polls += 1
+        while pending < len(completions) and completions[pending][0] <= now:
+            completed, index, start, duration = completions[pending]
+            record = records[index]
+            record.lastbackup_timestamp = start
+            record.lastbackup_duration = duration
+            record.nextbackup_timestamp = start + DAY
+            delays.append(now - completed)
+            pending += 1
+        if schedule:
+            now += schedule.next_interval(records, now)
+        else:
+            now += interval
+    return {
+        "polls_per_day": polls / days,
+        "delay_p50_seconds": statistics.median(delays),
+        "delay_p95_seconds": _percentile(delays, 0.95),
+        "delay_max_seconds": max(delays),
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Adaptive refresh schedule simulation")
+    parser.add_argument("--vms", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--windows", type=int, default=2)
+    parser.add_argument("--min-interval", type=float, default=15)
+    parser.add_argument("--max-interval", type=float, default=900)
+    parser.add_argument("--completion-window", type=float, default=900)
+    args = parser.parse_args()
+
+    runs = {
+        f"fixed {args.min_interval:.0f}s": simulate(
+            args.vms, args.days, args.windows, interval=args.min_interval
+        ),
+        "fixed 60s": simulate(args.vms, args.days, args.windows, interval=60),
+        "adaptive": simulate(
+            args.vms,
+            args.days,
+            args.windows,
+            schedule=AdaptiveSchedule(
+                min_interval=args.min_interval,
+                max_interval=args.max_interval,
+                completion_window=args.completion_window,
+            ),
+        ),
+    }
+    print(
+        f"{'schedule':<12} {'polls/day':>10} {'delay p50':>10} {'delay p95':>10} {'delay max':>10}"
+    )
+    for name, result in runs.items():
+        print(
+            f"{name:<12} {result['polls_per_day']:10.0f} {result['delay_p50_seconds']:10.1f}"
+            f" {result['delay_p95_seconds']:10.1f} {result['delay_max_seconds']:10.1f}"
+        )
@@ -0,0 +1,225 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.bench_startup"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Cold start benchmark: import time of altaro_exporter.metrics, and time to first byte of /
+from process spawn, against a fake Altaro REST API (see fake_altaro.py)
+
+By default the exporter is launched with python altaro_exporter.py (gunicorn on Linux, --dev for uvicorn)
+Use --command to benchmark a compiled binary instead, {config} is replaced by the config file path
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--dev] [--command "/path/to/altaro_exporter -c {config}"]
+                                          [--output results.json] [--baseline previous.json]
+"""
+
+
+import sys
+import os
+
+# Insert parent dir as path se we get to use altaro_exporter as package
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+from typing import List
+import json
+import platform
+import shlex
+import signal
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser
+import httpx
+from fake_altaro import FakeAltaro
+from bench_e2e import compare
+
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+EXPORTER_CONFIG = """
+altaro_server:
+  name: bench
+  rest_host: {host}
+  rest_port: {port}
+  rest_path: /api/rest
+  rest_scheme: http
+  server_port: 36014
+  server_address: localhost
+  username: bench
+  password: bench
+  domain: .
+options:
+  refresh_interval: 3600
+http_server:
+  listen: 127.0.0.1
+  port: {http_port}
+  log_file: {log_file}
+  no_auth: true
+  username:
+  password:
+"""
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import altaro_exporter.metrics
+print(time.perf_counter() - start)
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_import(runs: int) -> List[float]:
+    durations = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        durations.append(float(output.stdout.strip().splitlines()[-1]))
+    return durations
+
+
+def _first_byte(command: List[str], cwd: str, url: str, timeout: int) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        with httpx.Client(timeout=5) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if client.get(url).status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(
+                        f"Exporter exited with code {process.returncode}"
+                    )
+                time.sleep(0.005)
+        raise RuntimeError(f"Exporter did not answer within {timeout}s")
+    finally:
+        # gunicorn workers are in the same process group
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except (AttributeError, OSError):
+            process.terminate()
+        process.wait(timeout=30)
+
+
+def bench_first_byte(
+    runs: int, command: str = None, dev: bool = False, timeout: int = 60
+) -> List[float]:
+    fake = FakeAltaro(vms=100)
+    host, port = fake.start()
+    durations = []
+    try:
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as work_dir:
+                http_port = _free_port()
+                config_file = os.path.join(work_dir, "altaro_exporter.yaml")
+                with open(config_file, "w", encoding="utf-8") as file_handle:
+                    file_handle.write(
+                        EXPORTER_CONFIG.format(
+                            host=host,
+                            port=port,
+                            http_port=http_port,
+                            log_file=os.path.join(work_dir, "altaro_exporter.log"),
+                        )
+                    )
+                if command:
+                    args = shlex.split(command.format(config=config_file))
+                else:
+                    args = [
+                        sys.executable,
+                        os.path.join(ROOT_DIR, "altaro_exporter.py"),
+                        "-c",
+                        config_file,
+                    ]
+                    if dev:
+                        args.append("--dev")
+                durations.append(
+                    _first_byte(
+                        args, work_dir, f"http://127.0.0.1:{http_port}/", timeout
+                    )
+                )
+    finally:
+        fake.stop()
+    return durations
+
+
+def run(runs: int = 5, command: str = None, dev: bool = False) -> dict:
+    results = {}
+    if not command:
+        durations = bench_import(runs)
+        results["import_seconds"] = min(durations)
+        results["import_median_seconds"] = statistics.median(durations)
+    durations = bench_first_byte(runs, command=command, dev=dev)
+    results["first_byte_seconds"] = min(durations)
+    results["first_byte_median_seconds"] = statistics.median(durations)
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="altaro_exporter cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--dev", action="store_true", help="Run exporter with uvicorn")
+    parser.add_argument(
+        "--command",
+        type=str,
+        default=None,
+        help="Exporter command line, ex a compiled binary, {config} is replaced by config file path",
+    )
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--baseline", type=str, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run(args.runs, command=args.command, dev=args.dev)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)["results"]
+    ok = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            json.dump(
+                {
+                    "meta": {
+                        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "command": args.command,
+                        "dev": args.dev,
+                    },
+                    "results": results,
+                },
+                file_handle,
+                indent=2,
+            )
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.bench_timestamps"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Micro-benchmark of Altaro timestamp parsing
+Compares the former strptime + mktime conversion with parse_altaro_time, cold and memoized
+
+Usage: python benchmarks/bench_timestamps.py [number of distinct timestamps]
+"""
+
+
+import sys
+import os
+
+# Insert parent dir as path se we get to use altaro_exporter as package
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+import datetime
+import random
+import time
+import timeit
+from altaro_exporter.timestamps import (
+    parse_altaro_time,
+    set_altaro_timezone,
+    clear_altaro_time_cache,
+)
+
+
+def strptime_mktime(altaro_time: str) -> float:
+    """
+    Conversion used before parse_altaro_time existed
+    """
+    return float(
+        time.mktime(
+            datetime.datetime.strptime(altaro_time, "%Y-%m-%d-%H-%M-%S").timetuple()
+        )
+    )
+
+
+def make_timestamps(count: int):
+    now = time.time()
+    return [
+        time.strftime(
+            "%Y-%m-%d-%H-%M-%S", time.localtime(now - random.randint(0, 86400 * 30))
+        )
+        for _ in range(count)
+    ]
+
+
+def run(count: int = 10000, repeat: int = 5):
+    set_altaro_timezone("local")
+    timestamps = make_timestamps(count)
+
+    # Make sure we're comparing equal things
+    for altaro_time in timestamps[:100]:
+        assert strptime_mktime(altaro_time) == parse_altaro_time(altaro_time)
+
+    def _strptime():
+        for altaro_time in timestamps:
+            strptime_mktime(altaro_time)
+
+    def _cold():
+        clear_altaro_time_cache()
+        for altaro_time in timestamps:
+            parse_altaro_time(altaro_time)
+
+    def _warm():
+        for altaro_time in timestamps:
+            parse_altaro_time(altaro_time)
+
+    results = {}
+    for name, fn in (
+        ("strptime_mktime", _strptime),
+        ("parse_altaro_time_cold", _cold),
+        ("parse_altaro_time_warm", _warm),
+    ):
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        results[name] = best / count * 1e9
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results = run(count)
+    baseline = results["strptime_mktime"]
+    for name, ns_per_call in results.items():
+        print(f"{name:<24} {ns_per_call:10.1f} ns/call  x{baseline / ns_per_call:.1f}")
@@ -0,0 +1,314 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.benchmarks.fake_altaro"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Offline stand-in for Altaro REST API, serving sessions/start, sessions/end and vms/list/{session}[/1]
+Serves a synthetic fleet over plain http, with optional latency, token expiry and error injection
+Use rest_scheme: http in the exporter config to point it at this server
+
+Usage: python benchmarks/fake_altaro.py [--vms 1000] [--port 36013] [--latency 0.05] [--token-lifetime 1200] [--error-rate 0.01]
+"""
+
+
+from typing import List, Optional, Tuple
+import json
+import random
+import secrets
+import threading
+import time
+import uuid
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+RESULTS = ("Success", "Success", "Success", "Success", "Warning", "Error", "BASE_18")
+
+
+def _altaro_time(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%d-%H-%M-%S", time.localtime(timestamp))
+
+
+def make_vm(index: int, hosts: int = 10, now: float = None) -> dict:
+    """
+    VM object as found in vms/list results, with a realistic mix of
+    unconfigured, non scheduled, failed and offsite less VMs
+    """
+    if now is None:
+        now = time.time()
+    vm = {
+        "VirtualMachineName": f"vm-{index:06d}",
+        "HostName": f"hyperv-{index % hosts:03d}.example.local",
+        "HypervisorVirtualMachineUuid": str(
+            uuid.UUID(int=random.getrandbits(128))
+        ).upper(),
+        "Configured": True,
+        "LastBackupTime": None,
+        "LastOffsiteCopyTime": None,
+        "LastBackupDuration": None,
+        "LastOffsiteCopyDuration": None,
+        "LastBackupTransferSizeCompressed": None,
+        "LastBackupTransferSizeUncompressed": None,
+        "LastOffsiteCopyTransferSizeCompressed": None,
+        "LastOffsiteCopyTransferSizeUncompressed": None,
+        "LastBackupResult": None,
+        "LastOffsiteCopyResult": None,
+        "NextBackupTime": None,
+        "NextOffsiteCopyTime": None,
+        "ConfiguredBackupLocation": "\\\\nas01\\altaro",
+        "ConfiguredOffsiteLocation": None,
+    }
+    kind = random.random()
+    if kind < 0.05:
+        # Unconfigured VM
+        vm["Configured"] = False
+        return vm
+    last_backup = now - random.randint(600, 86400 * 2)
+    uncompressed = random.randint(1 << 28, 1 << 38)
+    vm.update(
+        {
+            "LastBackupTime": _altaro_time(last_backup),
+            "LastBackupDuration": random.randint(30, 7200),
+            "LastBackupTransferSizeCompressed": uncompressed // random.randint(2, 6),
+            "LastBackupTransferSizeUncompressed": uncompressed,
+            "LastBackupResult": random.choice(RESULTS),
+        }
+    )
+    if kind < 0.10:
+        # Configured but not scheduled anymore
+        return vm
+    vm["NextBackupTime"] = _altaro_time(now + random.randint(60, 86400))
+    if kind < 0.40:
+        # No offsite copy
+        return vm
+    vm.update(
+        {
+            "ConfiguredOffsiteLocation": "offsite.example.local",
+            "LastOffsiteCopyTime": _altaro_time(last_backup + random.randint(60, 7200)),
+            "LastOffsiteCopyDuration": random.randint(30, 7200),
+            "LastOffsiteCopyTransferSizeCompressed": uncompressed
+            // random.randint(4, 12),
+            "LastOffsiteCopyTransferSizeUncompressed": uncompressed,
+            "LastOffsiteCopyResult": random.choice(RESULTS),
+            "NextOffsiteCopyTime": _altaro_time(now + random.randint(3600, 86400)),
+        }
+    )
+    return vm
+
+
+def make_fleet(count: int, hosts: int = 10, seed: int = None) -> List[dict]:
+    if seed is not None:
+        random.seed(seed)
+    now = time.time()
+    return [make_vm(index, hosts=hosts, now=now) for index in range(count)]
+
+
+class FakeAltaro:
+    """
+    Fake Altaro REST API server running in a background thread
+
+    latency: seconds added to every request, plus up to latency_jitter seconds
+    token_lifetime: seconds after which session tokens get "Invalid Token" answers
+    error_rate: ratio of requests answered with HTTP 500 or an API error
+    """
+
+    def __init__(
+        self,
+        vms: int = 100,
+        hosts: int = 10,
+        rest_path: str = "/api/rest",
+        latency: float = 0,
+        latency_jitter: float = 0,
+        token_lifetime: Optional[float] = None,
+        error_rate: float = 0,
+        seed: int = None,
+    ):
+        self.rest_path = "/" + rest_path.strip("/")
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.token_lifetime = token_lifetime
+        self.error_rate = error_rate
+        self.fleet = make_fleet(vms, hosts=hosts, seed=seed)
+        self.tokens = {}
+        self.requests = {"sessions/start": 0, "sessions/end": 0, "vms/list": 0}
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self._server = None
+        self._thread = None
+        self._encode_fleet()
+
+    def _encode_fleet(self):
+        # vms/list bodies are encoded once per fleet change, so the fake server doesn't become the bottleneck
+        configured = [vm for vm in self.fleet if vm["Configured"]]
+        self._bodies = {
+            False: self._encode({"Success": True, "VirtualMachines": self.fleet}),
+            True: self._encode({"Success": True, "VirtualMachines": configured}),
+        }
+
+    @staticmethod
+    def _encode(data: dict) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    def churn(self, ratio: float = 0.05):
+        """
+        Simulate backups happening, updating last backup data of ratio of the fleet
+        """
+        now = time.time()
+        for vm in random.sample(self.fleet, int(len(self.fleet) * ratio)):
+            if vm["Configured"]:
+                vm["LastBackupTime"] = _altaro_time(now)
+                vm["LastBackupDuration"] = random.randint(30, 7200)
+                vm["LastBackupResult"] = random.choice(RESULTS)
+        self._encode_fleet()
+
+    def expire_tokens(self):
+        with self._lock:
+            self.tokens.clear()
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def _token_valid(self, token: str) -> bool:
+        with self._lock:
+            issued = self.tokens.get(token)
+        if issued is None:
+            return False
+        if self.token_lifetime is not None:
+            return time.monotonic() - issued < self.token_lifetime
+        return True
+
+    def _handle(self, method: str, path: str, body: bytes) -> Tuple[int, bytes]:
+        if not path.startswith(self.rest_path + "/"):
+            return 404, b""
+        endpoint = path[len(self.rest_path) + 1 :].strip("/")
+        parts = endpoint.split("/")
+
+        if method == "POST" and endpoint == "sessions/start":
+            self._count("sessions/start")
+            try:
+                payload = json.loads(body)
+                if not payload.get("Username") or not payload.get("Password"):
+                    raise ValueError
+            except ValueError:
+                return 200, self._encode(
+                    {"Success": False, "ErrorMessage": "Invalid credentials"}
+                )
+            token = secrets.token_hex(16)
+            with self._lock:
+                self.tokens[token] = time.monotonic()
+            return 200, self._encode({"Success": True, "Data": token})
+
+        if method == "POST" and endpoint == "sessions/end":
+            self._count("sessions/end")
+            return 200, self._encode({"Success": True, "Data": None})
+
+        if method == "GET" and parts[:2] == ["vms", "list"] and len(parts) in (3, 4):
+            self._count("vms/list")
+            if not self._token_valid(parts[2]):
+                return 200, self._encode(
+                    {
+                        "Success": False,
+                        "ErrorMessage": "Invalid Token. Please log in again",
+                    }
+                )
+            return 200, self._bodies[len(parts) == 4 and parts[3] == "1"]
+
+        return 404, b""
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if fake.latency or fake.latency_jitter:
+                    time.sleep(fake.latency + random.random() * fake.latency_jitter)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    if random.random() < 0.5:
+                        status, content = 500, b"Internal Server Error"
+                    else:
+                        status, content = 200, fake._encode(
+                            {"Success": False, "ErrorMessage": "Internal error"}
+                        )
+                else:
+                    status, content = fake._handle(method, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """
+        Start serving in a background thread, port 0 picks a free port
+        Returns the (host, port) actually listened on
+        """
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self._server.server_address[:2]
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Fake Altaro REST API server")
+    parser.add_argument("--vms", type=int, default=1000)
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--listen", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=36013)
+    parser.add_argument("--rest-path", type=str, default="/api/rest")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--latency-jitter", type=float, default=0)
+    parser.add_argument("--token-lifetime", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    fake = FakeAltaro(
+        vms=args.vms,
+        hosts=args.hosts,
+        rest_path=args.rest_path,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        token_lifetime=args.token_lifetime,
+        error_rate=args.error_rate,
+    )
+    host, port = fake.start(args.listen, args.port)
+    print(
+        f"Fake Altaro REST API with {args.vms} VMs on http://{host}:{port}{fake.rest_path}"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
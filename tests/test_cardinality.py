@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_cardinality"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from altaro_exporter.cardinality import SeriesRules, VMFilter, hash_label
+from altaro_exporter.collector import AltaroCollector, ServerSnapshot
+from altaro_exporter.instrumentation import create_registry
+from altaro_exporter.records import VMRecord
+
+
+def test_vm_filter_include_and_exclude():
+    vm_filter = VMFilter(
+        include_vmname=["sql-.*", "web-.*"],
+        exclude_vmname="web-test",
+        exclude_hostname="lab-.*",
+    )
+    assert vm_filter.wanted("sql-01", "hyperv-01")
+    assert vm_filter.wanted("web-01", "hyperv-01")
+    assert not vm_filter.wanted("web-test", "hyperv-01")
+    assert not vm_filter.wanted("sql-01", "lab-01")
+    # Regexes match whole names
+    assert not vm_filter.wanted("old-sql-01", "hyperv-01")
+    assert not vm_filter.wanted(None, "hyperv-01")
+
+
+def test_vm_filter_empty():
+    assert VMFilter().empty
+    assert VMFilter().wanted(None, None)
+    assert not VMFilter(include_hostname="hyperv-.*").empty
+
+
+def test_vm_filter_bogus_regex():
+    with pytest.raises(ValueError):
+        VMFilter(include_vmname="sql-(")
+
+
+def test_series_rules_keep_hash_drop():
+    vm = VMRecord("sql-01", None, "uuid-1")
+    rules = SeriesRules()
+    assert rules.identity
+    assert rules.label_names() == ["server", "vmname", "hostname", "vmuuid"]
+    assert rules.label_values("server", vm) == ["server", "sql-01", "", "uuid-1"]
+
+    rules = SeriesRules(labels={"vmname": "hash", "vmuuid": "drop"})
+    assert not rules.identity
+    assert rules.label_names() == ["server", "vmname", "hostname"]
+    assert rules.label_values("server", vm) == ["server", hash_label("sql-01"), ""]
+    assert len(hash_label("sql-01")) == 16
+    assert rules.label_value("vmuuid", "uuid-1") is None
+    assert rules.label_value("hostname", None) == ""
+
+
+def test_series_rules_bogus_labels():
+    with pytest.raises(ValueError):
+        SeriesRules(labels={"server": "drop"})
+    with pytest.raises(ValueError):
+        SeriesRules(labels={"vmname": "rename"})
+
+
+def test_disabled_metrics_matching():
+    rules = SeriesRules(
+        disabled_metrics=["altaro_lastoffsitecopy_*", "altaro_lastbackup_result"]
+    )
+    assert not rules.enabled("altaro_lastoffsitecopy_timestamp")
+    assert not rules.enabled("altaro_lastbackup_result")
+    assert rules.enabled("altaro_lastbackup_result_total")
+    assert rules.enabled("altaro_lastbackup_timestamp")
+
+
+def test_collector_applies_series_rules():
+    collector = AltaroCollector(
+        SeriesRules(
+            labels={"vmuuid": "drop"}, disabled_metrics=["altaro_lastoffsitecopy_*"]
+        )
+    )
+    collector.update(
+        [
+            ServerSnapshot(
+                name="server",
+                api_success=0,
+                vms=(VMRecord("sql-01", "hyperv-01", "uuid-1", 1000.0, 2000.0),),
+                success=True,
+            )
+        ]
+    )
+    families = {family.name: family for family in collector.collect()}
+    assert not any(name.startswith("altaro_lastoffsitecopy_") for name in families)
+    (sample,) = families["altaro_lastbackup_timestamp"].samples
+    assert sample.labels == {
+        "server": "server",
+        "vmname": "sql-01",
+        "hostname": "hyperv-01",
+    }
+    assert sample.value == 1000.0
+
+
+def _family_names(registry):
+    return {family.name for family in registry.collect()}
+
+
+def test_disabled_metrics_apply_to_process_metrics():
+    names = _family_names(create_registry())
+    assert "altaro_api_request_duration_seconds" in names
+    assert "altaro_api_failures" in names
+    rules = SeriesRules(
+        disabled_metrics=[
+            "altaro_api_request_duration_seconds*",
+            "altaro_api_failures_total",
+        ]
+    )
+    names = _family_names(create_registry(rules))
+    assert "altaro_api_request_duration_seconds" not in names
+    # Counters may be disabled by their exported name
+    assert "altaro_api_failures" not in names
+    assert "altaro_refresh_phase_duration_seconds" in names
@@ -0,0 +1,111 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_circuit_breaker"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from altaro_exporter import circuit_breaker
+from altaro_exporter.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from altaro_exporter.poller import AltaroServer, poll_server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _breaker():
+    return CircuitBreaker(
+        "server", failure_threshold=3, base_backoff=30, max_backoff=100, jitter=0
+    )
+
+
+def test_opens_after_failure_threshold(clock):
+    breaker = _breaker()
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = _breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    # Backoff doubled
+    clock[0] += 59
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.openings == 0
+
+
+def test_backoff_is_capped(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    for _ in range(5):
+        clock[0] += breaker.max_backoff
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.backoff() == 100
+
+
+class _RaisingAPI:
+    api_success = None
+
+    async def list_vms(self, **kwargs):
+        raise RuntimeError("bogus VM object")
+
+
+def test_raising_poll_reopens_half_open_breaker(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock[0] += 30
+    server = AltaroServer(name="server", api=_RaisingAPI(), breaker=breaker)
+    result = asyncio.run(poll_server(server))
+    assert not result.success and result.api_success == 2
+    assert breaker.state == OPEN
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_exposition"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import gzip
+import os
+import sys
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prometheus_client import CollectorRegistry, Gauge
+from altaro_exporter.exposition import (
+    render_exposition,
+    render_snapshot_age,
+    select_encoding,
+    append_to_body,
+    body_chunks,
+)
+
+
+def _exposition(samples: int = 1000):
+    registry = CollectorRegistry()
+    gauge = Gauge("altaro_test", "Test gauge", ["vmname"], registry=registry)
+    for index in range(samples):
+        gauge.labels(f"vm-{index:06d}").set(index)
+    return render_exposition(registry)
+
+
+def test_cached_gzip_is_complete():
+    exposition = _exposition()
+    encoding, body = select_encoding(exposition, "gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == exposition.identity
+
+
+def test_spliced_gzip_decompresses():
+    exposition = _exposition()
+    tail = render_snapshot_age([("server", 1000.0), ("never", None)], 1012.5)
+    encoding, body = select_encoding(exposition, "gzip")
+    content = append_to_body(exposition, encoding, body, tail)
+    assert gzip.decompress(content) == exposition.identity + tail
+    # A single member, so clients reading only the first member get the tail too
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decompressor.decompress(content) == exposition.identity + tail
+    assert decompressor.eof and not decompressor.unused_data
+
+
+def test_spliced_gzip_of_empty_exposition():
+    exposition = render_exposition(CollectorRegistry())
+    tail = render_snapshot_age([("server", 1.0)], 2.0)
+    content = append_to_body(exposition, "gzip", exposition.gzip, tail)
+    assert gzip.decompress(content) == exposition.identity + tail
+
+
+def test_body_chunks_dont_copy_cached_body():
+    exposition = _exposition()
+    tail = render_snapshot_age([("server", 1000.0)], 1012.5)
+    head, _ = body_chunks(exposition, "gzip", exposition.gzip, tail)
+    assert head.obj is exposition.gzip
+    head, _ = body_chunks(exposition, None, exposition.identity, tail)
+    assert head is exposition.identity
+
+
+def test_identity_body():
+    exposition = _exposition(10)
+    encoding, body = select_encoding(exposition, None)
+    assert encoding is None
+    assert append_to_body(exposition, encoding, body, b"tail\n") == (
+        exposition.identity + b"tail\n"
+    )
@@ -0,0 +1,119 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_inventory"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from altaro_exporter.inventory import VMInventory
+from altaro_exporter.records import VMRecord
+
+
+def _vm(index: int, last_backup: str = "2025-02-14-01-00-00", result="Success"):
+    return {
+        "VirtualMachineName": f"vm-{index}",
+        "HostName": "hyperv-01",
+        "HypervisorVirtualMachineUuid": f"uuid-{index}",
+        "LastBackupTime": last_backup,
+        "LastOffsiteCopyTime": None,
+        "LastBackupDuration": 60,
+        "LastOffsiteCopyDuration": None,
+        "LastBackupTransferSizeCompressed": 100,
+        "LastBackupTransferSizeUncompressed": 200,
+        "LastOffsiteCopyTransferSizeCompressed": None,
+        "LastOffsiteCopyTransferSizeUncompressed": None,
+        "LastBackupResult": result,
+        "LastOffsiteCopyResult": None,
+        "NextBackupTime": None,
+        "NextOffsiteCopyTime": None,
+    }
+
+
+def _names(records):
+    return sorted(record.vmname for record in records)
+
+
+def test_unchanged_vms_keep_their_records():
+    inventory = VMInventory("server")
+    first = inventory.update([_vm(1), _vm(2)], now=1000)
+    second = inventory.update([_vm(1), _vm(2)], now=1060)
+    assert _names(second) == ["vm-1", "vm-2"]
+    # Unchanged VMs aren't parsed again
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_changed_vm_is_parsed_again():
+    inventory = VMInventory("server")
+    inventory.update([_vm(1), _vm(2)], now=1000)
+    records = {
+        record.vmname: record
+        for record in inventory.update(
+            [_vm(1, last_backup="2025-02-15-01-00-00"), _vm(2)], now=1060
+        )
+    }
+    new = {
+        record.vmname: record
+        for record in VMInventory("other").update(
+            [_vm(1, last_backup="2025-02-15-01-00-00")]
+        )
+    }
+    assert records["vm-1"] == new["vm-1"]
+
+
+def test_failed_job_keeps_last_success():
+    inventory = VMInventory("server")
+    (record,) = inventory.update([_vm(1)], now=1000)
+    success = record.lastsuccessfulbackup_timestamp
+    assert success is not None
+    (record,) = inventory.update(
+        [_vm(1, last_backup="2025-02-15-01-00-00", result="Error")], now=1060
+    )
+    assert record.lastbackup_result == 2
+    assert record.lastsuccessfulbackup_timestamp == success
+
+
+def test_missing_vm_retired_after_grace_period():
+    inventory = VMInventory("server", retire_grace_period=300)
+    inventory.update([_vm(1), _vm(2)], now=1000)
+    assert _names(inventory.update([_vm(1)], now=1200)) == ["vm-1", "vm-2"]
+    # Back within the grace period, the VM isn't retired
+    assert _names(inventory.update([_vm(1), _vm(2)], now=1250)) == ["vm-1", "vm-2"]
+    assert _names(inventory.update([_vm(1)], now=1500)) == ["vm-1", "vm-2"]
+    assert _names(inventory.update([_vm(1)], now=1550)) == ["vm-1"]
+
+
+def test_missing_vm_retired_right_away_without_grace_period():
+    inventory = VMInventory("server")
+    inventory.update([_vm(1), _vm(2)], now=1000)
+    assert _names(inventory.update([_vm(2)], now=1060)) == ["vm-2"]
+
+
+def test_restored_records_are_replaced_on_first_poll():
+    inventory = VMInventory("server")
+    inventory.restore(
+        [
+            VMRecord("vm-1", "hyperv-01", "uuid-1", lastsuccessfulbackup_timestamp=1.0),
+            VMRecord("vm-3", "hyperv-01", "uuid-3"),
+        ],
+        timestamp=900,
+    )
+    (record,) = inventory.update(
+        [_vm(1, last_backup="2025-02-15-01-00-00", result="Error")], now=1000
+    )
+    assert record.lastbackup_result == 2
+    assert record.lastsuccessfulbackup_timestamp == 1.0
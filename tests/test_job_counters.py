@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_job_counters"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from altaro_exporter.inventory import VMInventory
+from altaro_exporter.job_counters import JobCounters
+from altaro_exporter.records import VMRecord
+
+
+def _vm(last_backup: str, result: str = "Success"):
+    return {
+        "VirtualMachineName": "vm-1",
+        "HostName": "hyperv-01",
+        "HypervisorVirtualMachineUuid": "uuid-1",
+        "LastBackupTime": last_backup,
+        "LastOffsiteCopyTime": None,
+        "LastBackupDuration": 60,
+        "LastOffsiteCopyDuration": None,
+        "LastBackupTransferSizeCompressed": 100,
+        "LastBackupTransferSizeUncompressed": 200,
+        "LastOffsiteCopyTransferSizeCompressed": None,
+        "LastOffsiteCopyTransferSizeUncompressed": None,
+        "LastBackupResult": result,
+        "LastOffsiteCopyResult": None,
+        "NextBackupTime": None,
+        "NextOffsiteCopyTime": None,
+    }
+
+
+def _samples(counters: JobCounters, name: str = "altaro_backups"):
+    for family in counters.collect():
+        if family.name == name:
+            return {
+                (sample.labels["server"], sample.labels["result"]): sample.value
+                for sample in family.samples
+                if sample.name.endswith("_total")
+            }
+    return None
+
+
+def test_declared_servers_start_at_zero():
+    counters = JobCounters()
+    counters.declare("server")
+    samples = _samples(counters)
+    assert samples[("server", "success")] == 0
+    assert set(samples.values()) == {0}
+
+
+def test_jobs_counted_across_polls():
+    counters = JobCounters()
+    inventory = VMInventory("server", counters=counters)
+    # VMs seen for the first time aren't counted, their previous job is unknown
+    inventory.update([_vm("2025-02-14-01-00-00")], now=1000)
+    assert _samples(counters)[("server", "success")] == 0
+    # Same job seen again
+    inventory.update([_vm("2025-02-14-01-00-00")], now=1060)
+    assert _samples(counters)[("server", "success")] == 0
+    inventory.update([_vm("2025-02-15-01-00-00", "Error")], now=1120)
+    inventory.update([_vm("2025-02-16-01-00-00")], now=1180)
+    inventory.update([_vm("2025-02-17-01-00-00", "Warning")], now=1240)
+    samples = _samples(counters)
+    assert samples[("server", "success")] == 1
+    assert samples[("server", "error")] == 1
+    assert samples[("server", "warning")] == 1
+    assert _samples(counters, "altaro_offsitecopies")[("server", "success")] == 0
+
+
+def test_save_load_round_trip(tmp_path):
+    path = tmp_path / "exporter.counters"
+    counters = JobCounters(path)
+    counters.declare("server")
+    previous = VMRecord("vm-1", "hyperv-01", "uuid-1", lastbackup_timestamp=1000.0)
+    record = VMRecord(
+        "vm-1",
+        "hyperv-01",
+        "uuid-1",
+        lastbackup_timestamp=2000.0,
+        lastbackup_result=0,
+    )
+    counters.count("server", previous, record)
+    counters.count("gone", previous, record)
+    assert counters.save()
+    # Nothing changed since last save
+    assert not counters.save()
+    assert json.loads(path.read_text())["version"] == 1
+
+    loaded = JobCounters(path)
+    loaded.declare("server")
+    assert loaded.load(["server"])
+    assert _samples(loaded)[("server", "success")] == 1
+    # Counts of servers not configured anymore are dropped
+    assert ("gone", "backups", "success") not in loaded.counts
+    # Saved counts add up with counts of this run
+    loaded.count("server", previous, record)
+    assert _samples(loaded)[("server", "success")] == 2
+
+
+def test_load_bogus_file(tmp_path):
+    path = tmp_path / "exporter.counters"
+    counters = JobCounters(path)
+    assert not counters.load(["server"])
+    path.write_text('{"version": 1, "counters": [["server", "backups"]]}')
+    assert not counters.load(["server"])
+    path.write_text('{"version": 99, "counters": []}')
+    assert not counters.load(["server"])
+    assert counters.counts == {}
@@ -0,0 +1,34 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_memory"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+)
+
+import pytest
+import bench_memory
+
+
+@pytest.mark.parametrize("count", [1000, 10000, 100000])
+def test_memory_per_vm(count):
+    body = bench_memory.make_vms_list(count)
+    bytes_per_vm = bench_memory.measure(body, bench_memory.slotted_inventory) / count
+    assert bytes_per_vm <= bench_memory.MAX_BYTES_PER_VM
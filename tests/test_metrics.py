@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_metrics"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+End to end tests of the exporter app against the fake Altaro REST API of benchmarks/fake_altaro.py
+
+Usage: python -m pytest tests
+"""
+
+
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(
+    0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+)
+
+import pytest
+from fastapi.testclient import TestClient
+from altaro_exporter.configuration import load_config
+from altaro_exporter.metrics import create_app
+from fake_altaro import FakeAltaro
+
+
+CONFIG = """
+altaro_server:
+  name: fake
+  rest_host: {host}
+  rest_port: {port}
+  rest_path: /api/rest
+  rest_scheme: http
+  server_port: 36014
+  server_address: localhost
+  username: test
+  password: test
+  domain: .
+options:
+  refresh_interval: 3600
+http_server:
+  no_auth: true
+  username:
+  password:
+"""
+
+
+@pytest.fixture
+def client(tmp_path):
+    fake_altaro = FakeAltaro(vms=100, seed=1)
+    host, port = fake_altaro.start()
+    config_file = tmp_path / "altaro_exporter.yaml"
+    config_file.write_text(CONFIG.format(host=host, port=port))
+    app = create_app(load_config(config_file), config_file)
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        fake_altaro.stop()
+
+
+def test_metrics(client):
+    response = client.get("/metrics", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert int(response.headers["Content-Length"]) == len(response.content)
+    assert b"\naltaro_lastbackup_timestamp{" in response.content
+    assert b'\naltaro_snapshot_age_seconds{server="fake"}' in response.content
+
+
+def test_gzip_metrics(client):
+    identity = client.get("/metrics", headers={"Accept-Encoding": "identity"})
+    with client.stream(
+        "GET", "/metrics", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        body = b"".join(response.iter_raw())
+    assert int(response.headers["Content-Length"]) == len(body)
+    content = gzip.decompress(body)
+    # Only the age tail differs between scrapes
+    assert content.split(b"# HELP altaro_snapshot_age_seconds")[0] == (
+        identity.content.split(b"# HELP altaro_snapshot_age_seconds")[0]
+    )
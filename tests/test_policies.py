@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_policies"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from altaro_exporter.policies import BackupPolicies, PolicyReport
+from altaro_exporter.records import VMRecord
+
+
+NOW = 100000.0
+DAY = 86400
+
+
+def _policies():
+    return BackupPolicies(
+        [
+            {
+                "name": "critical",
+                "vmname": "sql-.*",
+                "backup_max_age": DAY,
+                "offsitecopy_max_age": 2 * DAY,
+                "late_after": 3600,
+            },
+            {"name": "default", "backup_max_age": 2 * DAY},
+        ]
+    )
+
+
+def _vm(
+    vmname: str,
+    last_backup=None,
+    last_success=None,
+    next_backup=None,
+    last_offsitecopy=None,
+    last_offsitecopy_success=None,
+):
+    return VMRecord(
+        vmname,
+        "hyperv-01",
+        f"uuid-{vmname}",
+        lastbackup_timestamp=last_backup,
+        lastoffsitecopy_timestamp=last_offsitecopy,
+        nextbackup_timestamp=next_backup,
+        lastsuccessfulbackup_timestamp=last_success,
+        lastsuccessfuloffsitecopy_timestamp=last_offsitecopy_success,
+    )
+
+
+def _report(vms):
+    report = PolicyReport(_policies(), ["server", "vmname"], NOW)
+    for vm in vms:
+        report.add("server", ["server", vm.vmname], vm)
+    families = {family.name: family for family in report.collect()}
+    return {
+        name: {
+            tuple(sorted(sample.labels.items())): sample.value
+            for sample in family.samples
+        }
+        for name, family in families.items()
+    }
+
+
+def _overdue(samples, vmname: str, job: str = "backup"):
+    for labels, value in samples[f"altaro_{job}_overdue"].items():
+        if ("vmname", vmname) in labels:
+            return value, dict(labels)["policy"]
+    return None
+
+
+def test_first_matching_policy_applies():
+    policies = _policies()
+    assert policies.policy(_vm("sql-01")).name == "critical"
+    assert policies.policy(_vm("web-01")).name == "default"
+    assert (
+        BackupPolicies([{"name": "sql", "vmname": "sql-.*"}]).policy(_vm("web-01"))
+        is None
+    )
+
+
+def test_overdue_flags():
+    samples = _report(
+        [
+            # Recent success
+            _vm("sql-01", last_backup=NOW - 3600, last_success=NOW - 3600),
+            # Last success too old
+            _vm("sql-02", last_backup=NOW - 3600, last_success=NOW - 2 * DAY),
+            # Run but never succeeded
+            _vm("sql-03", last_backup=NOW - 3600),
+            # Next scheduled backup late by more than late_after
+            _vm(
+                "sql-04",
+                last_backup=NOW - 3600,
+                last_success=NOW - 3600,
+                next_backup=NOW - 7200,
+            ),
+            # Same age, looser policy
+            _vm("web-01", last_backup=NOW - 3600, last_success=NOW - 1.5 * DAY),
+            # Backup not configured
+            _vm("web-02"),
+        ]
+    )
+    assert _overdue(samples, "sql-01") == (0, "critical")
+    assert _overdue(samples, "sql-02") == (1, "critical")
+    assert _overdue(samples, "sql-03") == (1, "critical")
+    assert _overdue(samples, "sql-04") == (1, "critical")
+    assert _overdue(samples, "web-01") == (0, "default")
+    assert _overdue(samples, "web-02") is None
+    ages = {
+        dict(labels)["vmname"]: value
+        for labels, value in samples["altaro_lastsuccessfulbackup_age_seconds"].items()
+    }
+    assert ages == {
+        "sql-01": 3600,
+        "sql-02": 2 * DAY,
+        "sql-04": 3600,
+        "web-01": 1.5 * DAY,
+    }
+
+
+def test_policy_group_totals():
+    samples = _report(
+        [
+            _vm("sql-01", last_backup=NOW - 3600, last_success=NOW - 3600),
+            _vm("sql-02", last_backup=NOW - 3600, last_success=NOW - 2 * DAY),
+            _vm(
+                "sql-03",
+                last_offsitecopy=NOW - 3600,
+                last_offsitecopy_success=NOW - 3 * DAY,
+            ),
+        ]
+    )
+    labels = (("policy", "critical"), ("server", "server"))
+    assert samples["altaro_policy_vms"][labels] == 3
+    assert samples["altaro_policy_backup_overdue_vms"][labels] == 1
+    assert samples["altaro_policy_offsitecopy_overdue_vms"][labels] == 1
+    assert samples["altaro_policy_lastsuccessfulbackup_max_age_seconds"][labels] == (
+        2 * DAY
+    )
+
+
+def test_bogus_policies():
+    with pytest.raises(ValueError):
+        BackupPolicies([{"name": "a"}, {"name": "a"}])
+    with pytest.raises(ValueError):
+        BackupPolicies([{"name": "a", "backup_max_age": "daily"}])
+    with pytest.raises(ValueError):
+        BackupPolicies([{"name": "a", "unknown_key": 1}])
+    with pytest.raises(ValueError):
+        BackupPolicies([{"vmname": "sql-.*"}])
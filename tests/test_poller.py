@@ -0,0 +1,53 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_poller"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prometheus_client import REGISTRY
+from altaro_exporter.collector import ServerSnapshot
+from altaro_exporter.poller import VMSource
+from altaro_exporter.scheduler import AdaptiveSchedule
+
+
+def _refresh_interval():
+    return REGISTRY.get_sample_value("altaro_refresh_interval_seconds")
+
+
+def _results(success: bool = True):
+    return [ServerSnapshot(name="server", api_success=0, vms=(), success=success)]
+
+
+def test_refresh_interval_without_adaptive_refresh():
+    source = VMSource(refresh_interval=120)
+    source.update(_results(), 1000.0)
+    assert _refresh_interval() == 120
+
+
+def test_refresh_interval_with_adaptive_refresh():
+    source = VMSource(
+        refresh_interval=120,
+        schedule=AdaptiveSchedule(min_interval=15, max_interval=900),
+    )
+    # No job scheduled
+    source.update(_results(), 1000.0)
+    assert _refresh_interval() == 900
+    # Failed polls are retried every refresh_interval
+    source.update(_results(success=False), 1060.0)
+    assert _refresh_interval() == 120
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_session"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from altaro_exporter.session import SessionManager, SessionStore
+
+
+class _API:
+    """
+    Session attributes of AsyncAltaroAPI
+    """
+
+    def __init__(self):
+        self.session_id = None
+        self.session_started = None
+
+
+def test_encrypted_round_trip(tmp_path):
+    path = tmp_path / "exporter.sessions"
+    store = SessionStore(path)
+    assert store.get("server") is None
+    started = time.time()
+    store.set("server", "secret-session-id", started)
+    store.set("other", "other-session-id", started)
+    assert b"secret-session-id" not in path.read_bytes()
+    store = SessionStore(path)
+    assert store.get("server") == {
+        "session_id": "secret-session-id",
+        "started": started,
+    }
+    # Logged out sessions are forgotten
+    store.set("server", None, None)
+    store = SessionStore(path)
+    assert store.get("server") is None
+    assert store.get("other")["session_id"] == "other-session-id"
+
+
+def test_bogus_file(tmp_path):
+    path = tmp_path / "exporter.sessions"
+    path.write_text("not encrypted")
+    assert SessionStore(path).get("server") is None
+
+
+def test_resume_persisted_session(tmp_path):
+    path = tmp_path / "exporter.sessions"
+    api = _API()
+    api.session_id = "session-id"
+    api.session_started = time.time() - 100
+    SessionManager(api, "server", store=SessionStore(path), max_age=1200).persist()
+
+    api = _API()
+    manager = SessionManager(api, "server", store=SessionStore(path), max_age=1200)
+    assert manager.resume()
+    assert api.session_id == "session-id"
+    assert 99 < manager.age < 200
+
+
+def test_old_session_not_resumed(tmp_path):
+    path = tmp_path / "exporter.sessions"
+    SessionStore(path).set("server", "session-id", time.time() - 1190)
+    api = _API()
+    manager = SessionManager(api, "server", store=SessionStore(path), max_age=1200)
+    assert not manager.resume()
+    assert api.session_id is None
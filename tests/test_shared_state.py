@@ -0,0 +1,125 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_shared_state"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import asyncio
+import os
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from prometheus_client import CollectorRegistry, Gauge
+from altaro_exporter.exposition import render_exposition
+from altaro_exporter.poller import Poller, Snapshot, VMSource
+from altaro_exporter.shared_state import (
+    FORMAT_VERSION,
+    HEADER,
+    MAGIC,
+    LeaderLock,
+    SharedSnapshot,
+)
+
+
+def _snapshot(timestamp: float) -> Snapshot:
+    return Snapshot(
+        exposition=render_exposition(CollectorRegistry()),
+        timestamp=timestamp,
+        success=True,
+        server_timestamps=(("server", timestamp),),
+    )
+
+
+def test_publish_load_round_trip(tmp_path):
+    registry = CollectorRegistry()
+    gauge = Gauge("altaro_test", "Test gauge", ["vmname"], registry=registry)
+    for index in range(100):
+        gauge.labels(f"vm-{index}").set(index)
+    snapshot = Snapshot(
+        exposition=render_exposition(registry),
+        timestamp=1234.5,
+        success=False,
+        server_timestamps=(("server", 1000.0), ("never", None)),
+    )
+    path = tmp_path / "exporter.snapshot"
+    assert SharedSnapshot(path).publish(snapshot)
+    magic, version = struct.unpack_from("<4sB", path.read_bytes())
+    assert (magic, version) == (MAGIC, FORMAT_VERSION)
+    shared = SharedSnapshot(path)
+    loaded = shared.load()
+    assert loaded.timestamp == 1234.5 and loaded.success is False
+    assert loaded.server_timestamps == snapshot.server_timestamps
+    assert loaded.exposition.identity == snapshot.exposition.identity
+    assert loaded.exposition.gzip == snapshot.exposition.gzip
+    assert loaded.exposition.zstd == snapshot.exposition.zstd
+    assert loaded.exposition.crc32 == snapshot.exposition.crc32
+    # Unchanged file isn't read again
+    assert shared.load() is loaded
+
+
+def test_bogus_file_keeps_last_snapshot(tmp_path):
+    path = tmp_path / "exporter.snapshot"
+    shared = SharedSnapshot(path)
+    assert shared.load() is None
+    SharedSnapshot(path).publish(_snapshot(1000.0))
+    loaded = shared.load()
+    assert loaded is not None
+    path.write_bytes(HEADER.pack(b"XXXX", FORMAT_VERSION, 0, True, 0, 0, 0, 0, -1))
+    assert shared.load() is loaded
+    path.write_bytes(HEADER.pack(MAGIC, FORMAT_VERSION - 1, 0, True, 0, 0, 0, 0, -1))
+    assert shared.load() is loaded
+
+
+def _poller(tmp_path) -> Poller:
+    return Poller(
+        [],
+        [VMSource()],
+        leader_lock=LeaderLock(tmp_path / "exporter.lock"),
+        shared=SharedSnapshot(tmp_path / "exporter.snapshot"),
+        max_staleness=600,
+    )
+
+
+def test_leader_removes_leftover_snapshot(tmp_path):
+    SharedSnapshot(tmp_path / "exporter.snapshot").publish(_snapshot(time.time() - 48))
+    poller = _poller(tmp_path)
+
+    async def scrape():
+        poller.start()
+        try:
+            return poller.get_snapshot()
+        finally:
+            await poller.stop()
+
+    assert asyncio.run(scrape()) is None
+    assert not (tmp_path / "exporter.snapshot").exists()
+
+
+def test_follower_ignores_snapshot_older_than_max_staleness(tmp_path):
+    leader_lock = LeaderLock(tmp_path / "exporter.lock")
+    assert leader_lock.acquire()
+    shared = SharedSnapshot(tmp_path / "exporter.snapshot")
+    try:
+        shared.publish(_snapshot(time.time() - 3600))
+        poller = _poller(tmp_path)
+        assert poller.get_snapshot() is None
+        # A snapshot published by the current leader is served
+        shared.publish(_snapshot(time.time()))
+        snapshot = poller.get_snapshot()
+        assert snapshot is not None and snapshot.server_timestamps[0][0] == "server"
+    finally:
+        leader_lock.release()
@@ -0,0 +1,74 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_timestamps"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from altaro_exporter import timestamps
+from altaro_exporter.timestamps import (
+    clear_altaro_time_cache,
+    parse_altaro_time,
+    set_altaro_timezone,
+)
+
+
+@pytest.fixture
+def utc():
+    set_altaro_timezone("UTC")
+    yield
+    set_altaro_timezone(None)
+
+
+def test_parse(utc):
+    assert parse_altaro_time("2024-08-13-01-53-14") == 1723513994.0
+    assert parse_altaro_time("2024-08-13-01-53-14") == 1723513994.0
+    assert parse_altaro_time(None) is None
+    assert parse_altaro_time("") is None
+
+
+@pytest.mark.parametrize(
+    "altaro_time",
+    [
+        "2024/08/13 01:53:14",
+        "2024-08-13-01-53-1",
+        "2024-13-13-01-53-14",
+        "yyyy-mm-dd-hh-mm-ss",
+    ],
+)
+def test_malformed_strings(utc, altaro_time):
+    assert parse_altaro_time(altaro_time) is None
+
+
+@pytest.mark.parametrize("altaro_time", [1723513994, 1723513994.0, {"Time": 1}, [1]])
+def test_other_types(altaro_time):
+    assert parse_altaro_time(altaro_time) is None
+
+
+def test_cache_is_bounded_and_cleared(utc, monkeypatch):
+    monkeypatch.setattr(timestamps, "MAX_CACHED_TIMES", 2)
+    for second in range(5):
+        parse_altaro_time(f"2024-08-13-01-53-0{second}")
+        assert len(timestamps._PARSED_TIMES) <= 2
+    clear_altaro_time_cache()
+    assert not timestamps._PARSED_TIMES
+    # Timezone changes invalidate cached times
+    parse_altaro_time("2024-08-13-01-53-14")
+    set_altaro_timezone("Europe/Paris")
+    assert parse_altaro_time("2024-08-13-01-53-14") == 1723513994.0 - 7200
@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+#  -*- coding: utf-8 -*-
+#
+# This file is part of altaro_exporter
+
+__intname__ = "altaro_exporter.tests.test_vm_store"
+__author__ = "Orsiris de Jong"
+__copyright__ = "Copyright (C) 2024-2025 NetInvent"
+__license__ = "GPL-3.0-only"
+__build__ = "2025021401"
+
+
+"""
+Usage: python -m pytest tests
+"""
+
+
+import marshal
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from altaro_exporter.records import VMRecord
+from altaro_exporter.vm_store import FORMAT_VERSION, HEADER, MAGIC, VMStore
+
+
+def _records():
+    return (
+        VMRecord(
+            "vm-1",
+            "hyperv-01",
+            "uuid-1",
+            lastbackup_timestamp=1000.0,
+            lastbackup_duration=60,
+            lastbackup_transfersize_compressed=1 << 40,
+            lastbackup_result=0,
+            nextbackup_timestamp=2000.0,
+            lastsuccessfulbackup_timestamp=1000.0,
+        ),
+        VMRecord("vm-2", None, None, lastoffsitecopy_result=2),
+    )
+
+
+def test_round_trip(tmp_path):
+    store = VMStore(tmp_path / "exporter.vms")
+    assert store.load() == []
+    records = _records()
+    assert store.save([("server", 1234.5, records), ("empty", 1.0, ())])
+    loaded = store.load()
+    assert [(name, timestamp) for name, timestamp, _ in loaded] == [
+        ("server", 1234.5),
+        ("empty", 1.0),
+    ]
+    assert loaded[0][2] == records
+    assert all(
+        getattr(loaded[0][2][0], slot) == getattr(records[0], slot)
+        for slot in VMRecord.__slots__
+    )
+
+
+def _write(path, fields, values, version=FORMAT_VERSION):
+    with open(path, "wb") as file_handle:
+        file_handle.write(HEADER.pack(MAGIC, version, marshal.version, time.time()))
+        marshal.dump((fields, [("server", 1.0, [values])]), file_handle)
+
+
+def test_files_with_other_fields_are_ignored(tmp_path):
+    path = tmp_path / "exporter.vms"
+    values = tuple(getattr(_records()[0], slot) for slot in VMRecord.__slots__)
+    _write(path, VMRecord.__slots__, values)
+    assert VMStore(path).load()[0][2] == _records()[:1]
+    # A slot was added since the file was written
+    _write(path, VMRecord.__slots__[:-1], values[:-1])
+    assert VMStore(path).load() == []
+    # Slots were reordered
+    _write(path, tuple(reversed(VMRecord.__slots__)), tuple(reversed(values)))
+    assert VMStore(path).load() == []
+
+
+def test_bogus_files_are_ignored(tmp_path):
+    path = tmp_path / "exporter.vms"
+    values = tuple(getattr(_records()[0], slot) for slot in VMRecord.__slots__)
+    _write(path, VMRecord.__slots__, values, version=FORMAT_VERSION - 1)
+    assert VMStore(path).load() == []
+    path.write_bytes(b"ALTV")
+    assert VMStore(path).load() == []
+    path.write_bytes(HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, 0) + b"x")
+    assert VMStore(path).load() == []